@@ -7,51 +7,119 @@
 # Version 2.0 - Sep 4, 2023
 ########################################################################
 
-import os
+import os,sys
 import argparse
-from script.checkin import get_fagb
+from script.checkin import get_fagb, get_runID
 from script.single import _single
 from script.metaICE import _meta
-from script.config import get_param
+from script.batch import _batch
+from script.config import get_param, get_resource, set_option
+from script.scheduler import set_budget
+from script.runner import cancel
+from script.workspace import release
 
 param = get_param()
 workdir = param[0]
-tmp_dir = os.path.join(workdir,'tmp')
-fa_dir = os.path.join(tmp_dir,'fasta') 
-gb_dir = os.path.join(tmp_dir,'gbk')
 
 def add_arguments_to_parser(parser):
 
 	parser.add_argument('-v', '--version', action='version', version='2.0',
                         help="Show ICEfinder version")
-	parser.add_argument('-i', '--input', type=str, required=True,
-                        help='FASTA/Genbank format file, Genbank format file accepted only for single genome.')
-	parser.add_argument('-t', '--type', type=str, required=True,
+	parser.add_argument('-i', '--input', type=str,
+                        help='FASTA/Genbank format file (plain, gzip, bzip2 or xz), - for stdin. Genbank format file accepted only for single genome.')
+	parser.add_argument('-n', '--jobid', type=str,
+                        help='JobID of the run (default: input file name without extension, required for stdin input)')
+	parser.add_argument('-t', '--type', type=str,
                         help='Genome Type: Single/Metagenome')
+	parser.add_argument('-l', '--list', type=str,
+                        help='List file for batch mode, one genome per line: file Single/Metagenome [runID]')
+	parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of genomes run in parallel in batch mode')
+	parser.add_argument('-p', '--parallel', type=int, default=1,
+                        help='Number of contigs processed in parallel in Metagenome mode')
+	parser.add_argument('--cores', type=int, default=0,
+                        help='Total CPU cores shared by all external tools (default: [Resource] in config.ini, 0 = all cores)')
+	parser.add_argument('--memory', type=float, default=0,
+                        help='Total memory in GB shared by all external tools (default: [Resource] in config.ini, 0 = no limit)')
+	parser.add_argument('--meta-anno', type=str, choices=['prokka','pooled','prodigal'],
+                        help='Annotate prescan-positive contigs one by one, in one pooled prokka run, or reuse the prescan Prodigal genes (default: [Option] in config.ini)')
+	parser.add_argument('--dr-search', type=str, choices=['local','vmatch'],
+                        help='Direct repeat search around ICE boundaries or genome-wide with vmatch (default: [Option] in config.ini)')
+	parser.add_argument('--taxonomy', type=str, choices=['full','lazy'],
+                        help='Classify the whole metagenome with Kraken2 or only the contigs carrying ICEs (default: [Option] in config.ini)')
+	parser.add_argument('--taxfile', type=str,
+                        help='Contig classification to reuse instead of running Kraken2 (Kraken2 output or contig/taxid table)')
+	parser.add_argument('--cache-dir', type=str,
+                        help='Persistent cache of annotation, ICEscan, DR and homology results (default: [Option] in config.ini)')
+	parser.add_argument('--homology', type=str, choices=['genome','region'],
+                        help='Search all proteins or only the proteins of detected ICE regions (default: [Option] in config.ini)')
+	parser.add_argument('--homsearch', type=str, choices=['blast','diamond','mmseqs'],
+                        help='Homology search backend (default: [Option] in config.ini)')
+	parser.add_argument('--output', type=str, choices=['full','headless'],
+                        help='Write the HTML/JS visualization or only the JSON and FASTA results (default: [Option] in config.ini)')
+	parser.add_argument('--scratch', type=str,
+                        help='Directory for per-run scratch workspaces, e.g. node-local SSD or /dev/shm (default: [Option] in config.ini, empty = ./tmp)')
+	parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted Single mode run from its first unfinished stage')
 
 if __name__ == "__main__":
 
-	parser = argparse.ArgumentParser(description='ICEfinder', usage='python ICEfinder.py -i fasta_file/genbank_file -t Single/Metagenome',
+	parser = argparse.ArgumentParser(description='ICEfinder', usage='python ICEfinder.py -i fasta_file/genbank_file -t Single/Metagenome | -l list_file -j jobs',
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 	add_arguments_to_parser(parser)
 	args = parser.parse_args()
 	intype = args.type
 	input_file = args.input
+	if not args.list and not (input_file and intype):
+		parser.error('the following arguments are required: -i/--input, -t/--type (or -l/--list)')
+	if input_file == '-' and not args.jobid:
+		parser.error('-n/--jobid is required for stdin input')
 
-	if not os.path.exists(tmp_dir):
-		os.mkdir(tmp_dir)
-	if not os.path.exists(gb_dir):
-		os.mkdir(gb_dir)
-	if not os.path.exists(fa_dir):
-		os.mkdir(fa_dir)
+	cores,memory = get_resource()
+	set_budget(args.cores or cores, args.memory or memory)
+	if args.meta_anno:
+		set_option('metaanno', args.meta_anno)
+	if args.dr_search:
+		set_option('drsearch', args.dr_search)
+	if args.taxonomy:
+		set_option('taxonomy', args.taxonomy)
+	if args.taxfile:
+		set_option('taxfile', os.path.abspath(args.taxfile))
+	if args.cache_dir:
+		set_option('cachedir', os.path.abspath(args.cache_dir))
+	if args.homology:
+		set_option('homology', args.homology)
+	if args.homsearch:
+		set_option('homsearch', args.homsearch)
+	if args.output:
+		set_option('output', args.output)
+	if args.scratch:
+		set_option('scratch', os.path.abspath(args.scratch))
+	if args.resume:
+		set_option('resume', True)
 
-	runID = file_name_without_extension = os.path.splitext(os.path.basename(input_file))[0]
+	if args.list:
+		sumfile = _batch(args.list,args.jobs,args.parallel)
+		print('Batch summary: '+sumfile)
+		sys.exit()
 
-	infile,filetype = get_fagb(runID,input_file,intype)
+	runID = args.jobid or get_runID(input_file)
 
-	if intype == 'Single':
-		_single(runID,infile,filetype)
-	else:
-		_meta(runID,infile)
+	try:
+		infile,filetype = get_fagb(runID,input_file,intype)
+		if intype == 'Single':
+			_single(runID,infile,filetype)
+		else:
+			_meta(runID,infile,args.parallel)
+	except KeyboardInterrupt:
+		cancel()
+		release()
+		print('ERROR: '+runID+' interrupted')
+		sys.exit(1)
+	except RuntimeError as e:
+		cancel()
+		release()
+		print('ERROR: '+runID+' failed: '+str(e))
+		sys.exit(1)
 
 	print(runID+' done!!')
@@ -0,0 +1,74 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,shutil,uuid
+from script.config import get_param, get_search, get_option
+from script.runner import run
+from script import workspace as ws
+
+param = get_param()
+workdir = param[0]
+blastp = param[4]
+blastn = param[5]
+mmseqs,diamond = get_search()
+
+outfmt = 'qseqid sseqid pident length mismatch gapopen qstart qend sstart send evalue bitscore slen stitle'
+mmfmt = 'query,target,pident,alnlen,mismatch,gapopen,qstart,qend,tstart,tend,evalue,bits,tlen,theader'
+
+def get_backend(dbtype='prot'):
+
+	backend = get_option('homsearch', 'blast')
+	if backend == 'diamond' and dbtype == 'nucl':
+		return 'blast'
+	return backend
+
+def get_tag(sseqid):
+
+	if '~' in sseqid:
+		return sseqid.split('~', 1)[0]
+	return ''
+
+def best_hits(rawout, out):
+
+	seen = set()
+	with open(rawout,'r') as rawin, open(out,'w') as outfile:
+		for line in rawin:
+			lines = line.split('\t', 2)
+			if len(lines) < 2:
+				continue
+			hitkey = (lines[0],get_tag(lines[1]))
+			if hitkey not in seen:
+				seen.add(hitkey)
+				outfile.write(line)
+	os.remove(rawout)
+
+def blast_search(query, db, out, threads, dbtype, maxhits=1):
+
+	cmd = [blastn if dbtype == 'nucl' else blastp, '-query', query, '-db', db, '-evalue', '0.0001', '-num_threads', threads,
+	       '-max_hsps', '1', '-num_descriptions', maxhits, '-num_alignments', maxhits, '-outfmt', '6 std slen stitle', '-out', out+'.raw']
+	run(cmd)
+	best_hits(out+'.raw', out)
+
+def diamond_search(query, db, out, threads, dbtype, maxhits=1):
+
+	cmd = [diamond, 'blastp', '--sensitive', '--quiet', '-q', query, '-d', db+'.dmnd', '-o', out+'.raw',
+	       '-e', '0.0001', '--max-target-seqs', maxhits, '--max-hsps', '1', '-p', threads, '-f', '6'] + outfmt.split()
+	run(cmd)
+	best_hits(out+'.raw', out)
+
+def mmseqs_search(query, db, out, threads, dbtype, maxhits=1):
+
+	mmtmp = os.path.join(ws.tmp_dir, 'mmseqs_'+uuid.uuid4().hex)
+	cmd = [mmseqs, 'easy-search', query, db+'.mmseqs', out+'.raw', mmtmp, '-e', '0.0001',
+	       '--threads', threads, '--format-output', mmfmt, '-v', '1']
+	if dbtype == 'nucl':
+		cmd += ['--search-type', '3']
+	run(cmd)
+	shutil.rmtree(mmtmp, ignore_errors=True)
+	best_hits(out+'.raw', out)
+
+backends = {'blast':blast_search, 'diamond':diamond_search, 'mmseqs':mmseqs_search}
+
+def homsearch(query, db, out, threads, dbtype='prot', backend='', maxhits=1):
+
+	backends[backend or get_backend(dbtype)](query, db, out, threads, dbtype, maxhits)
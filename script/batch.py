@@ -0,0 +1,128 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,io,time,json
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from script.checkin import get_fagb, get_runID
+from script.single import _single
+from script.metaICE import _meta
+from script.config import get_param, options, set_option
+from script.scheduler import set_budget, split_budget
+from script.workspace import release
+
+param = get_param()
+workdir = param[0]
+
+def read_manifest(manifest):
+
+	joblist = []
+	with open(manifest,'r') as mfin:
+		for line in mfin.readlines():
+			if not line.strip() or line.startswith('#'):
+				continue
+			lines = line.strip().split()
+			input_file = lines[0]
+			if len(lines) > 1:
+				intype = lines[1]
+			else:
+				intype = 'Single'
+			if len(lines) > 2:
+				runID = lines[2]
+			else:
+				runID = get_runID(input_file)
+			joblist.append([input_file,intype,runID])
+	return joblist
+
+def init_worker(cores,memory,opts):
+
+	set_budget(cores,memory)
+	for key,value in opts.items():
+		set_option(key,value)
+
+def get_error(logs):
+
+	msg = ''
+	for line in logs.splitlines():
+		if line.startswith('ERROR'):
+			msg = line
+	return msg
+
+def run_one(input_file,intype,runID,workers=1):
+
+	start = time.time()
+	logs = io.StringIO()
+	status = 'done'
+	msg = ''
+	try:
+		with redirect_stdout(logs):
+			infile,filetype = get_fagb(runID,input_file,intype)
+			if intype == 'Single':
+				_single(runID,infile,filetype)
+			else:
+				_meta(runID,infile,workers)
+	except SystemExit:
+		status = 'failed'
+		msg = get_error(logs.getvalue()) or 'Input rejected'
+	except Exception as e:
+		status = 'failed'
+		msg = type(e).__name__+': '+str(e)
+	finally:
+		release()
+
+	return {'JobID':runID,
+		'Input':input_file,
+		'Type':intype,
+		'Status':status,
+		'Time (s)':"%.1f"%(time.time()-start),
+		'Message':msg
+		}
+
+def check_job(input_file,intype,runID,seen):
+
+	if intype not in ['Single','Metagenome']:
+		return 'Genome Type should be Single/Metagenome'
+	if not os.path.isfile(input_file):
+		return 'Input file not found'
+	if runID in seen:
+		return 'Duplicated runID in list file'
+	return ''
+
+def _batch(manifest,jobs,workers=1):
+
+	result_dir = os.path.join(workdir,'result')
+	if not os.path.exists(result_dir):
+		os.makedirs(result_dir)
+	listID = os.path.splitext(os.path.basename(manifest))[0]
+	sumfile = os.path.join(result_dir,listID+'_batch.json')
+
+	joblist = read_manifest(manifest)
+	sumlist = []
+	seen = set()
+	todo = []
+	for idx,[input_file,intype,runID] in enumerate(joblist):
+		msg = check_job(input_file,intype,runID,seen)
+		if msg:
+			sumlist.append([idx,{'JobID':runID,'Input':input_file,'Type':intype,
+				'Status':'failed','Time (s)':'0.0','Message':msg}])
+			print(runID+' failed: '+msg)
+		else:
+			todo.append([idx,input_file,intype,runID])
+		seen.add(runID)
+
+	jobs = max(1,jobs)
+	with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=split_budget(jobs)+(dict(options),)) as pool:
+		futures = dict((pool.submit(run_one,input_file,intype,runID,workers),idx) for idx,input_file,intype,runID in todo)
+		for future in as_completed(futures):
+			res = future.result()
+			if res['Status'] == 'done':
+				print(res['JobID']+' done!! ('+res['Time (s)']+' s)')
+			else:
+				print(res['JobID']+' failed: '+res['Message'])
+			sumlist.append([futures[future],res])
+
+	sumlist = [res for idx,res in sorted(sumlist, key=lambda x: x[0])]
+	with open(sumfile,'w') as sum_file:
+		json.dump(sumlist, sum_file, indent=4)
+
+	return sumfile
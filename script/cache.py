@@ -0,0 +1,124 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,glob,shutil,hashlib,threading,uuid
+from Bio import SeqIO
+from script.config import get_option
+
+lock = threading.Lock()
+stamps = {}
+
+def get_cachedir():
+
+	return get_option('cachedir', '')
+
+def make_key(*parts):
+
+	return hashlib.sha256('\0'.join(str(x) for x in parts).encode()).hexdigest()
+
+def file_hash(path):
+
+	sha = hashlib.sha256()
+	with open(path,'rb') as fin:
+		for chunk in iter(lambda: fin.read(1 << 20), b''):
+			sha.update(chunk)
+	return sha.hexdigest()
+
+def fasta_hash(path):
+
+	sha = hashlib.sha256()
+	for record in SeqIO.parse(path, "fasta"):
+		sha.update(str(record.seq).upper().encode())
+		sha.update(b'\n')
+	return sha.hexdigest()
+
+def get_files(path):
+
+	if os.path.isdir(path):
+		files = []
+		for dirpath, dirnames, filenames in os.walk(path):
+			files.extend(os.path.join(dirpath, filename) for filename in filenames)
+		return sorted(files)
+	if os.path.isfile(path):
+		return [path]
+	which = shutil.which(path)
+	if which:
+		return [which]
+	return sorted(glob.glob(path + '.*'))
+
+def stamp(*paths):
+
+	with lock:
+		if paths in stamps:
+			return stamps[paths]
+	sha = hashlib.sha256()
+	for path in paths:
+		sha.update(path.encode())
+		for filename in get_files(path):
+			stat = os.stat(filename)
+			sha.update(("%s %d %d" % (os.path.relpath(filename, path) if os.path.isdir(path) else os.path.basename(filename), stat.st_size, stat.st_mtime_ns)).encode())
+	value = sha.hexdigest()
+	with lock:
+		stamps[paths] = value
+	return value
+
+def entry(stage, key):
+
+	return os.path.join(get_cachedir(), stage, key[:2], key)
+
+def fetch(stage, key, files):
+
+	if not get_cachedir():
+		return False
+	cdir = entry(stage, key)
+	if not all(os.path.isfile(os.path.join(cdir, name)) for name in files):
+		return False
+	for name,dest in files.items():
+		if os.path.dirname(dest) and not os.path.exists(os.path.dirname(dest)):
+			os.makedirs(os.path.dirname(dest), exist_ok=True)
+		shutil.copyfile(os.path.join(cdir, name), dest)
+	return True
+
+def clear(files):
+
+	for dest in files.values():
+		if os.path.isfile(dest):
+			os.remove(dest)
+
+def store(stage, key, files):
+
+	if not get_cachedir():
+		return
+	if not all(os.path.isfile(dest) for dest in files.values()):
+		return
+	cdir = entry(stage, key)
+	if os.path.exists(cdir):
+		return
+	tmpdir = cdir + '.' + uuid.uuid4().hex
+	os.makedirs(tmpdir)
+	for name,dest in files.items():
+		shutil.copyfile(dest, os.path.join(tmpdir, name))
+	try:
+		os.rename(tmpdir, cdir)
+	except OSError:
+		shutil.rmtree(tmpdir, ignore_errors=True)
+
+def relabel_gff(gffile, seqid):
+
+	with open(gffile,'r') as gffin:
+		lines = gffin.readlines()
+	with open(gffile,'w') as gffout:
+		fasta = False
+		for line in lines:
+			if line.startswith('##FASTA'):
+				fasta = True
+			elif fasta and line.startswith('>'):
+				line = '>' + seqid + '\n'
+			elif line.startswith('##sequence-region'):
+				items = line.split()
+				line = ' '.join([items[0], seqid] + items[2:]) + '\n'
+			elif not fasta and not line.startswith('#'):
+				items = line.split('\t')
+				if len(items) > 8:
+					line = '\t'.join([seqid] + items[1:])
+			gffout.write(line)
@@ -1,41 +1,63 @@
 #!/public/wangm/miniconda3/bin/python
 # -*- coding: utf-8 -*-
 
-import os,sys,shutil
+import os,sys,io,gzip,bz2,lzma,shutil
 from Bio import SeqIO
 from script.config import get_param
+from script.checkpoint import input_hash, can_resume, start_run, get_stage, mark_done
+from script import workspace as ws
+from script.genome import Genome, put_genome
 
 param = get_param()
 workdir = param[0]
-tmp_dir = os.path.join(workdir,'tmp') 
-in_dir = os.path.join(tmp_dir,'fasta')
-gb_dir = os.path.join(tmp_dir,'gbk')
-
-def is_fagb(filename):
-
-	filetype = ''
-	with open(filename, "r") as handle1:
-		fasta = SeqIO.parse(handle1, "fasta")
-		if any(fasta):
-			filetype = 'fa'
-	with open(filename, "r") as handle2:
-		gbk = SeqIO.parse(handle2, "gb")
-		if any(gbk):
-			filetype = 'gb'
-	return filetype
-
-def remove_folders_with_runID(root_dir, runID):
-    for dirpath, dirnames, filenames in os.walk(root_dir, topdown=False):
-        for dirname in dirnames:
-            if runID in dirname:
-                dir_to_remove = os.path.join(dirpath, dirname)
-#                print(f"Removing folder: {dir_to_remove}")
-                shutil.rmtree(dir_to_remove)
-        for filename in filenames:
-            if runID in filename:
-                file_to_remove = os.path.join(dirpath, filename)
-#                print(f"Removing file: {file_to_remove}")
-                os.remove(file_to_remove)
+
+compress = [[b'\x1f\x8b',gzip.open],[b'BZh',bz2.open],[b'\xfd7zXZ\x00',lzma.open]]
+suffixes = ['.gz','.bz2','.xz']
+
+def get_runID(input_file):
+
+	filename = os.path.basename(input_file)
+	for suffix in suffixes:
+		if filename.endswith(suffix):
+			filename = filename[:-len(suffix)]
+	return os.path.splitext(filename)[0]
+
+def open_input(input_file):
+
+	if input_file == '-':
+		handle = sys.stdin.buffer
+	else:
+		handle = open(input_file, 'rb')
+	head = handle.peek(6)[:6]
+	for magic,opener in compress:
+		if head.startswith(magic):
+			if input_file != '-':
+				handle.close()
+				handle = input_file
+			return io.BufferedReader(opener(handle), 1 << 16)
+	return handle
+
+def sniff(handle):
+
+	head = handle.peek(1 << 16).lstrip()
+	if head.startswith(b'>'):
+		return 'fa'
+	if head.startswith(b'LOCUS'):
+		return 'gb'
+	return ''
+
+def check_gb(seq_records):
+
+	i = 0
+	for seq_feature in seq_records.features:
+		if seq_feature.type=="CDS" and 'locus_tag' not in seq_feature.qualifiers:
+			i += 1
+			if i > 10:
+				print('ERROR: Too many CDS do not have locus_tag in GenBank input file! Please check or try FASTA format input!')
+				sys.exit()
+	if len(set(str(seq_records.seq))) == 1:
+		print('ERROR: The uploaded file is not a standard GenBank format! Please check or try a FASTA format input!')
+		sys.exit()
 
 def get_fagb(runID,input_file,intype):
 
@@ -47,64 +69,58 @@ def get_fagb(runID,input_file,intype):
 #	folder_path = os.path.join(tmp_dir, runID)
 #	if os.path.exists(folder_path) and os.path.isdir(folder_path):
 #		shutil.rmtree(folder_path)
-	remove_folders_with_runID(gb_dir,runID)
-	remove_folders_with_runID(tmp_dir,runID)
+	ws.open_run(runID)
+	inhash = input_hash(input_file,intype)
+	if can_resume(runID,inhash,intype):
+		return tuple(get_stage(runID,'ingestion'))
+
+	ws.reset()
+	start_run(runID,inhash,intype)
 
-	infile = os.path.join(in_dir,runID)
-	shutil.copy(input_file, infile)
 	try:
-		filetype = is_fagb(infile)
-	except:
+		handle = open_input(input_file)
+		filetype = sniff(handle)
+	except (OSError,EOFError,lzma.LZMAError):
+		filetype = ''
+	if not filetype:
 		print('ERROR: The input file is not a standard FASTA/GenBank format! Please check !')
 		sys.exit()
 
-	if not filetype:
+	newfile = os.path.join(ws.in_dir,runID+'.fa')
+	if filetype == 'fa' and intype == 'Metagenome':
+		try:
+			with handle, open(newfile, 'wb') as outfile:
+				shutil.copyfileobj(handle, outfile, 1 << 20)
+		except (OSError,EOFError,lzma.LZMAError):
+			print('ERROR: The input file is not a standard FASTA/GenBank format! Please check !')
+			sys.exit()
+		mark_done(runID,'ingestion',[newfile,'multifa'])
+		return newfile,'multifa'
+
+	try:
+		with handle:
+			records = list(SeqIO.parse(io.TextIOWrapper(handle), 'fasta' if filetype == 'fa' else 'gb'))
+	except Exception:
+		records = []
+	if not records:
 		print('ERROR: The input file is not a standard FASTA/GenBank format! Please check !')
 		sys.exit()
+	if len(records) > 1:
+		print('ERROR: Input file accepted for one sequence only.')
+		sys.exit()
 
-	else:
-		if filetype == 'fa':
-			newfile = os.path.join(in_dir,runID+'.fa')
-			seq_record = SeqIO.parse(infile, 'fasta')
-			if len(list(seq_record)) == 1:
-				for seq_records in SeqIO.parse(infile, 'fasta'):
-					seq_records.id = runID
-					SeqIO.write(seq_records, newfile, 'fasta')
-			elif intype == 'Metagenome':
-				shutil.copy(infile, newfile)
-				filetype = 'multifa'
-			else:
-				print('ERROR: Input file accepted for one sequence only.')
-				sys.exit()
-		else:
-			if not os.path.exists(gb_dir):
-				os.makedirs(gb_dir)
-				os.chmod(gb_dir, 0o777)
-			gbfile = os.path.join(gb_dir,runID+'.gbk')
-			newfile = os.path.join(in_dir,runID+'.fa')
-			seq_record = SeqIO.parse(infile, 'gb')
-			if len(list(seq_record)) == 1:
-				i = 0
-				for seq_records in SeqIO.parse(infile, 'gb'):
-					for seq_feature in seq_records.features:
-						if seq_feature.type=="CDS":
-							if 'locus_tag' in seq_feature.qualifiers:
-								continue
-							else:
-								i += 1
-								if i > 10:
-									print('ERROR: Too many CDS do not have locus_tag in GenBank input file! Please check or try FASTA format input!')
-									sys.exit()
-					if len(set(list(str(seq_records.seq)))) == 1:
-						print('ERROR: The uploaded file is not a standard GenBank format! Please check or try a FASTA format input!')
-						sys.exit()
-
-					else:			
-						seq_records.id = runID
-						SeqIO.write(seq_records, gbfile, 'gb')
-						SeqIO.write(seq_records, newfile, 'fasta')
-			else:
-				print('ERROR: Input file accepted for one sequence only.')
-				sys.exit()
+	seq_records = records[0]
+	features = None
+	if filetype == 'gb':
+		check_gb(seq_records)
+		features = seq_records.features
+	realID = seq_records.id
+	seq_records.id = runID
+	if filetype == 'gb':
+		SeqIO.write(seq_records, os.path.join(ws.gb_dir,runID+'.gbk'), 'gb')
+	SeqIO.write(seq_records, newfile, 'fasta')
 
+	genome = put_genome(newfile, Genome(runID, seq_records.seq, seq_records.description, features))
+	mark_done(runID,'sequence',{'name':realID[:15],'length':len(genome),'gc':genome.gc(1,len(genome))})
+	mark_done(runID,'ingestion',[newfile,filetype])
 	return newfile,filetype
@@ -0,0 +1,68 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,json,threading
+from script.config import get_param, get_option
+from script.cache import file_hash
+from script import workspace as ws
+
+param = get_param()
+workdir = param[0]
+lock = threading.Lock()
+
+def stage_file(runID):
+
+	return os.path.join(ws.tmp_dir, runID, runID+'_stages.json')
+
+def load_stages(runID):
+
+	stagefile = stage_file(runID)
+	if not os.path.isfile(stagefile):
+		return {}
+	try:
+		with open(stagefile,'r') as stin:
+			return json.load(stin)
+	except ValueError:
+		return {}
+
+def is_done(runID,stage):
+
+	return stage in load_stages(runID)
+
+def get_stage(runID,stage):
+
+	return load_stages(runID).get(stage)
+
+def mark_done(runID,stage,value=True,outputs=()):
+
+	missing = [path for path in outputs if not os.path.isfile(path)]
+	if missing:
+		raise RuntimeError(stage+' did not produce '+', '.join(missing))
+	stagefile = stage_file(runID)
+	with lock:
+		stages = load_stages(runID)
+		stages[stage] = value
+		if not os.path.exists(os.path.dirname(stagefile)):
+			os.makedirs(os.path.dirname(stagefile))
+		with open(stagefile+'.tmp','w') as stout:
+			json.dump(stages, stout, indent=4)
+		os.replace(stagefile+'.tmp', stagefile)
+
+def input_hash(input_file,intype):
+
+	if not get_option('resume', False) or intype != 'Single' or input_file == '-':
+		return ''
+	return file_hash(input_file)
+
+def can_resume(runID,inhash,intype):
+
+	if not inhash:
+		return False
+	stages = load_stages(runID)
+	if 'ingestion' not in stages:
+		return False
+	return stages.get('input') == [inhash,intype]
+
+def start_run(runID,inhash,intype):
+
+	mark_done(runID,'input',[inhash,intype])
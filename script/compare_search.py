@@ -0,0 +1,44 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,sys,glob,time
+from script.backend import homsearch, backends
+from script.function import havalue, IS_Database, VF_Database, metal_Database, pop_Database, sym_Database
+
+databases = [['IS',IS_Database,'0.64'],['VF',VF_Database,'0.64'],['metal',metal_Database,'0.64'],
+	     ['degradation',pop_Database,'0.64'],['symbiosis',sym_Database,'0.64']]
+
+def compare(faafiles,outdir,threads=8):
+
+	if not os.path.exists(outdir):
+		os.makedirs(outdir)
+	query = os.path.join(outdir,'query.faa')
+	with open(query,'w') as outfa:
+		for faafile in faafiles:
+			with open(faafile,'r') as faain:
+				outfa.write(faain.read().rstrip('\n')+'\n')
+
+	rows = []
+	for name,db,value in databases:
+		hits = {}
+		for backend in backends:
+			out = os.path.join(outdir,name+'.'+backend+'.m8')
+			start = time.time()
+			homsearch(query,db,out,threads,'prot',backend)
+			hits[backend] = [havalue(value,out),time.time()-start]
+
+		ref,reftime = hits['blast']
+		for backend,[found,usetime] in hits.items():
+			same = sum(1 for gene,subject in ref.items() if found.get(gene) == subject)
+			recall = same*100.0/len(ref) if ref else 100.0
+			rows.append([name,backend,str(len(found)),"%.1f"%recall,"%.1f"%usetime])
+
+	print('\t'.join(['Database','Backend','Hits','Recall vs BLAST (%)','Time (s)']))
+	for row in rows:
+		print('\t'.join(row))
+	return rows
+
+if __name__ == '__main__':
+
+	faafiles = sys.argv[1:] or sorted(glob.glob(os.path.join('example','result_demo','*','*.faa')))
+	compare(faafiles,os.path.join('tmp','compare_search'))
@@ -3,6 +3,7 @@ import os
 
 conf = configparser.ConfigParser()
 conf.read("./config.ini")
+options = {}
 
 def get_param():
 	options = conf.options("Param")
@@ -21,3 +22,23 @@ def get_param():
 	hmmsearch = conf.get("Param", "hmmsearch")	
 
 	return workdir,kraken,krakenDB,defensefinder,blastp,blastn,seqkit,prodigal,prokka,macsyfinder,hmmsearch
+
+def get_search():
+	mmseqs = conf.get("Param", "mmseqs", fallback="mmseqs")
+	diamond = conf.get("Param", "diamond", fallback="diamond")
+
+	return mmseqs,diamond
+
+def get_resource():
+	cores = conf.getint("Resource", "cores", fallback=0)
+	memory = conf.getfloat("Resource", "memory", fallback=0)
+
+	return cores,memory
+
+def get_option(key, fallback=''):
+	if key in options:
+		return options[key]
+	return conf.get("Option", key, fallback=fallback)
+
+def set_option(key, value):
+	options[key] = value
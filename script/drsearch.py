@@ -0,0 +1,92 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import re
+from script.genome import load_genome
+from script.cache import get_cachedir, make_key, fasta_hash, stamp, fetch, store
+from script.scheduler import lease
+from script.runner import run, stream
+
+kmer = 15
+minspan = 5000
+maxspan = 500000
+maxhits = 64
+nonbase = re.compile('[^ACGT]')
+
+def extend_pair(seq, i, j, k):
+
+	a,b = i,j
+	while a > 0 and seq[a-1] == seq[b-1] and seq[a-1] in 'ACGT':
+		a -= 1
+		b -= 1
+	e = k
+	while j+e < len(seq) and seq[i+e] == seq[j+e] and seq[i+e] in 'ACGT':
+		e += 1
+	return a,b,(i-a)+e
+
+def find_pairs(seq, anchor_s, anchor_e, win_s, win_e, k=kmer):
+
+	anchor_s = max(0,anchor_s)
+	win_s = max(0,win_s)
+	index = {}
+	for i in range(anchor_s, min(len(seq)-k,anchor_e)+1):
+		word = seq[i:i+k]
+		if not nonbase.search(word):
+			index.setdefault(word,[]).append(i)
+	for word in [word for word,hits in index.items() if len(hits) > maxhits]:
+		del index[word]
+
+	pairs = set()
+	for j in range(win_s, min(len(seq)-k,win_e)+1):
+		hits = index.get(seq[j:j+k])
+		if hits:
+			for i in hits:
+				if i == j:
+					continue
+				if i > anchor_s and j > win_s and seq[i-1] == seq[j-1] and seq[i-1:i+k-1] in index:
+					continue
+				pairs.add(extend_pair(seq, min(i,j), max(i,j), k))
+	return pairs
+
+def local_DR(infile, gs, ge, side, base=1):
+
+	seq = load_genome(infile).upper()
+
+	if side == 's':
+		pairs = find_pairs(seq, gs-kmer, ge, gs, ge+maxspan+kmer)
+	else:
+		pairs = find_pairs(seq, gs-kmer, ge, gs-maxspan-kmer, ge)
+
+	DRlist = []
+	for a,b,lengt in pairs:
+		DR = [a+base,a+lengt,b+base,b+lengt]
+		if not minspan <= DR[3] - DR[0] <= maxspan:
+			continue
+		if side == 's' and gs < DR[0] < ge:
+			DRlist.append(DR)
+		elif side == 'e' and gs < DR[3] < ge:
+			DRlist.append(DR)
+	DRlist.sort(key=lambda x: (x[0]-x[1], x[0], x[2]))
+	return DRlist
+
+def vmatch_DR(infile, DRindex, DRout, base=1):
+
+	key = make_key(fasta_hash(infile), stamp('./tool/mkvtree','./tool/vmatch'), 'l15 pairs')
+	pairs = []
+	if fetch('vmatch',key,{'DRout':DRout}):
+		with open(DRout,'r') as DRin:
+			pairs = [[int(x) for x in line.split()] for line in DRin]
+	else:
+		with lease(1):
+			run(['./tool/mkvtree','-db',infile,'-indexname',DRindex,'-dna','-pl','-lcp','-suf','-tis','-ois','-bwt','-bck','-sti1'])
+			for line in stream(['./tool/vmatch','-l','15',DRindex]):
+				if not line.startswith('#'):
+					lines = line.split()
+					pairs.append([int(lines[0]),int(lines[2]),int(lines[4]),int(lines[6])])
+		if get_cachedir():
+			with open(DRout,'w') as DRo:
+				for pair in pairs:
+					DRo.write('%d %d %d %d\n' % tuple(pair))
+			store('vmatch',key,{'DRout':DRout})
+
+	return [[p1+base,p1+l1,p2+base,p2+l2] for l1,p1,l2,p2 in pairs]
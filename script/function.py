@@ -3,19 +3,22 @@
 
 import os,time,json
 from Bio import SeqIO
-from Bio.SeqUtils import GC
-from script.config import get_param
-from Bio.Blast.Applications import NcbiblastpCommandline
-from Bio.Blast.Applications import NcbiblastnCommandline
+from concurrent.futures import ThreadPoolExecutor
+from script.config import get_param, get_search, get_option
+from script.scheduler import lease, get_budget
+from script.runner import run
+from script.cache import make_key, file_hash, stamp, fetch, clear, store
+from script.hitstore import search
+from script.backend import homsearch, get_backend
+from script import workspace as ws
 
 param = get_param()
 workdir = param[0]
 defensefinder = param[3]
 blastp = param[4]
 blastn = param[5]
+mmseqs,diamond = get_search()
 
-tmp_dir = os.path.join(workdir,'tmp')
-gb_dir = os.path.join(tmp_dir,'gbk')
 
 VF_Database = os.path.join(workdir,'data','virulence')
 IS_Database = os.path.join(workdir,'data','transposase')
@@ -23,87 +26,34 @@ arg_Database = os.path.join(workdir,'data','resfinder')
 metal_Database = os.path.join(workdir,'data','metal')
 pop_Database = os.path.join(workdir,'data','degradation')
 sym_Database = os.path.join(workdir,'data','symbiosis')
-
-##### Test
-##### Not used
-def getmmseq(runID):
-
-	mmseq_dir = os.path.join(tmp_dir,runID,'mmseq')
-	if not os.path.exists(mmseq_dir):
-		os.makedirs(mmseq_dir)
-	
-	if not os.path.exists(os.path.join(tmp_dir,runID,runID+'.locus_tag.faa')):
-		infaa = os.path.join(gb_dir,runID+'.faa')
-	else:
-		infaa = os.path.join(tmp_dir,runID,runID+'.locus_tag.faa')
-
-	argDB = os.path.join('mmseqDB','resfinder','resfinder')
-	vfDB = os.path.join('mmseqDB','vfdb','vfdb')
-	isDB = os.path.join('mmseqDB','isfinder','isfinder')
-
-	tmpd = os.path.join(mmseq_dir,'tmp')
-	queryDB = os.path.join(mmseq_dir,runID+'_queryDB')
-	argres = os.path.join(mmseq_dir,runID+'_tarDB','resfDB')
-	vfres = os.path.join(mmseq_dir,runID+'_tarDB','vfresDB')
-	isres = os.path.join(mmseq_dir,runID+'_tarDB','isresDB')
-	argout = os.path.join(tmp_dir,runID,'arg.m8')
-	vfout = os.path.join(tmp_dir,runID,'vf.m8')
-	isout = os.path.join(tmp_dir,runID,'is.m8')
-
-	if not os.path.exists(os.path.join(mmseq_dir,runID+'_tarDB')):
-		os.makedirs(os.path.join(mmseq_dir,runID+'_tarDB'))	
-
-	queryDBc = ['mmseqs','createdb',infaa,queryDB, '> /dev/null']
-	argc = ['mmseqs', 'search', queryDB, argDB, argres, tmpd, '> /dev/null']
-	argconv = ['mmseqs', 'convertalis', '--format-mode 2', queryDB, argDB, argres, argout, '> /dev/null']
-
-	vfc = ['mmseqs', 'search', queryDB, vfDB, vfres, tmpd, '> /dev/null']
-	vfconv = ['mmseqs', 'convertalis', '--format-mode 2', queryDB, vfDB, vfres, vfout, '> /dev/null']
-
-	isc = ['mmseqs', 'search', queryDB, isDB, isres, tmpd, '> /dev/null']
-	isconv = ['mmseqs', 'convertalis', '--format-mode 2', queryDB, isDB, isres, isout, '> /dev/null']
-
-	os.system(' '.join(queryDBc))
-	os.system(' '.join(argc))
-	os.system(' '.join(vfc))
-	os.system(' '.join(isc))
-	os.system(' '.join(argconv))
-	os.system(' '.join(vfconv))
-	os.system(' '.join(isconv))
-
-	argdict = getres(argout)
-	vfdict = getres(vfout)
-	isdict = getres(isout)
-	dfdict = getdf(runID)
-
-	return argdict,vfdict,isdict,dfdict
-
-def getres(mmout): ##not used
-
-	mmdict = {}
-	with open(mmout) as mmseqr:
-		for line in mmseqr.readlines():
-			lines = line.strip().split('\t')
-			hvalue = int(lines[3])/int(lines[13])*float(lines[2])
-			if lines[0] not in mmdict:
-				if hvalue >= 0.64:
-					mmdict[lines[0]] = lines[1].split('|')[1]
-	return mmdict
-
-#### Not used
-#### Test
-
-def getdf(runID):
-
-	if not os.path.exists(os.path.join(tmp_dir,runID,runID+'.locus_tag.faa')):
-		infaa = os.path.join(gb_dir,runID+'.faa')
-	else:
-		infaa = os.path.join(tmp_dir,runID,runID+'.locus_tag.faa')
-
-	dfout = os.path.join(tmp_dir,runID,'defense_'+runID)
-	defcmd = [defensefinder, 'run', '-w 8 --models-dir ./data/macsydata/','-o', dfout, infaa, '> /dev/null']
-	os.system(' '.join(defcmd))
-
+merged_Database = os.path.join(workdir,'data','protein_all')
+oriT_Database = os.path.join(workdir,'data','oriT_db')
+flank = 10
+maxhits = 5000
+
+def getdf(runID,threads=8,infaa=''):
+
+	if not infaa:
+		if not os.path.exists(os.path.join(ws.tmp_dir,runID,runID+'.locus_tag.faa')):
+			infaa = os.path.join(ws.gb_dir,runID+'.faa')
+		else:
+			infaa = os.path.join(ws.tmp_dir,runID,runID+'.locus_tag.faa')
+
+	dfout = os.path.join(ws.tmp_dir,runID,'defense_'+runID)
+	dffiles = {'defense_finder_genes.tsv':os.path.join(dfout,'defense_finder_genes.tsv')}
+	key = make_key(file_hash(infaa), stamp(defensefinder,'./data/macsydata'))
+	if not fetch('defensefinder',key,dffiles):
+		clear(dffiles)
+		with lease(threads) as ncpu:
+			defcmd = [defensefinder, 'run', '-w', ncpu, '--models-dir', './data/macsydata/', '-o', dfout, infaa]
+			run(defcmd)
+		store('defensefinder',key,dffiles)
+
+	return readdf(runID)
+
+def readdf(runID):
+
+	dfout = os.path.join(ws.tmp_dir,runID,'defense_'+runID)
 	dfdict = {}
 	with open(os.path.join(dfout,'defense_finder_genes.tsv')) as dfres:
 		for line in dfres.readlines():
@@ -113,41 +63,53 @@ def getdf(runID):
 
 	return dfdict
 
-def isblast(faa_file,IS_out):
-	blastp_cline = NcbiblastpCommandline(cmd=blastp, query=faa_file, db=IS_Database, \
-                       evalue=0.0001, num_threads=20, max_hsps=1, num_descriptions=1, \
-                       num_alignments=1, outfmt="6 std slen stitle", out=IS_out)
-	blastp_cline()
-
-def vfblast(faa_file,VF_out):
-	blastp_cline = NcbiblastpCommandline(cmd=blastp, query=faa_file, db=VF_Database, \
-                       evalue=0.0001, num_threads=20, max_hsps=1, num_descriptions=1, \
-                       num_alignments=1, outfmt="6 std slen stitle", out=VF_out)
-	blastp_cline()
-
-def argblast(fa_file,arg_out):
-	blastp_cline = NcbiblastnCommandline(cmd=blastn, query=fa_file, db=arg_Database, \
-                       evalue=0.0001, num_threads=20, max_hsps=1, num_descriptions=1, \
-                       num_alignments=1, outfmt="6 std slen stitle", out=arg_out)
-	blastp_cline()
-
-def metalblast(faa_file,metal_out):
-	blastp_cline = NcbiblastpCommandline(cmd=blastp, query=faa_file, db=metal_Database, \
-                       evalue=0.0001, num_threads=20, max_hsps=1, num_descriptions=1, \
-                       num_alignments=1, outfmt="6 std slen stitle", out=metal_out)
-	blastp_cline()
-
-def popblast(faa_file,pop_out):
-	blastp_cline = NcbiblastpCommandline(cmd=blastp, query=faa_file, db=pop_Database, \
-                       evalue=0.0001, num_threads=20, max_hsps=1, num_descriptions=1, \
-                       num_alignments=1, outfmt="6 std slen stitle", out=pop_out)
-	blastp_cline()
-
-def symblast(faa_file,sym_out):
-	blastp_cline = NcbiblastpCommandline(cmd=blastp, query=faa_file, db=sym_Database, \
-                       evalue=0.0001, num_threads=20, max_hsps=1, num_descriptions=1, \
-                       num_alignments=1, outfmt="6 std slen stitle", out=sym_out)
-	blastp_cline()
+def isblast(faa_file,IS_out,threads=20):
+	with lease(threads) as ncpu:
+		homsearch(faa_file,IS_Database,IS_out,ncpu,'prot')
+
+def vfblast(faa_file,VF_out,threads=20):
+	with lease(threads) as ncpu:
+		homsearch(faa_file,VF_Database,VF_out,ncpu,'prot')
+
+def argblast(fa_file,arg_out,threads=20):
+	with lease(threads) as ncpu:
+		homsearch(fa_file,arg_Database,arg_out,ncpu,'nucl')
+
+def metalblast(faa_file,metal_out,threads=20):
+	with lease(threads) as ncpu:
+		homsearch(faa_file,metal_Database,metal_out,ncpu,'prot')
+
+def popblast(faa_file,pop_out,threads=20):
+	with lease(threads) as ncpu:
+		homsearch(faa_file,pop_Database,pop_out,ncpu,'prot')
+
+def symblast(faa_file,sym_out,threads=20):
+	with lease(threads) as ncpu:
+		homsearch(faa_file,sym_Database,sym_out,ncpu,'prot')
+
+def combblast(faa_file,comb_out,threads=20):
+	with lease(threads) as ncpu:
+		homsearch(faa_file,merged_Database,comb_out,ncpu,'prot',maxhits=maxhits)
+
+def split_hits(comb_out,outdict):
+
+	outfiles = dict((tag,open(out,'w')) for tag,out in outdict.items())
+	with open(comb_out,'r') as combin:
+		for line in combin:
+			lines = line.split('\t')
+			if len(lines) < 2 or '~' not in lines[1]:
+				continue
+			tag,sseqid = lines[1].split('~',1)
+			if tag in outfiles:
+				outfiles[tag].write('\t'.join([lines[0],sseqid]+lines[2:]))
+	for outfile in outfiles.values():
+		outfile.close()
+
+def cached_blast(blast,query,db,out,threads):
+
+	backend = get_backend('nucl' if blast == argblast else 'prot')
+	dbkey = make_key(backend, blast.__name__, stamp(blastp,blastn,mmseqs,diamond,db), 'evalue 0.0001 max_hsps 1')
+	search(blast,query,out,threads,dbkey)
 
 def havalue(value,out):
 
@@ -159,42 +121,125 @@ def havalue(value,out):
 			blast_filter[lines[0]]=lines[1].split('|')[1]
 	return blast_filter
 
-def getblast(runID):
-	
-	arg_out = os.path.join(tmp_dir,runID,'arg.m8')
-	vf_out = os.path.join(tmp_dir,runID,'vf.m8')
-	is_out = os.path.join(tmp_dir,runID,'is.m8')
-	pop_out = os.path.join(tmp_dir,runID,'pop.m8')
-	metal_out = os.path.join(tmp_dir,runID,'metal.m8')
-	sym_out = os.path.join(tmp_dir,runID,'sym.m8')
+def region_genes(dictICE,table):
 
+	genes = set()
+	for value in dictICE.values():
+		finalstart,finalend = value[6],value[7]
+		for num in range(finalstart-flank,finalend+flank+1):
+			if num in table.index:
+				genes.add(table.gene(num))
+	return genes
 
-	if not os.path.exists(os.path.join(tmp_dir,runID,runID+'.locus_tag.faa')):
-		infaa = os.path.join(gb_dir,runID+'.faa')
-		infa = os.path.join(gb_dir,runID+'.ffn')
-	else:
-		infaa = os.path.join(tmp_dir,runID,runID+'.locus_tag.faa')
-		infa = os.path.join(tmp_dir,runID,runID+'.locus_tag.spaceHeader.ffn')
+def subset_fasta(infile,outfile,genes):
 
-	isblast(infaa,is_out)
-	vfblast(infaa,vf_out)
-	argblast(infa,arg_out)
+	count = 0
+	with open(outfile,'w') as outfa:
+		for record in SeqIO.parse(infile, "fasta"):
+			if record.id in genes:
+				outfa.write(">%s\n%s\n" % (record.description,record.seq))
+				count += 1
+	return count
 
-	metalblast(infaa,metal_out)
-	popblast(infaa,pop_out)
-	symblast(infa,sym_out)
+def getblast(runID,threads=0,genes=None):
+	
+	arg_out = os.path.join(ws.tmp_dir,runID,'arg.m8')
+	vf_out = os.path.join(ws.tmp_dir,runID,'vf.m8')
+	is_out = os.path.join(ws.tmp_dir,runID,'is.m8')
+	pop_out = os.path.join(ws.tmp_dir,runID,'pop.m8')
+	metal_out = os.path.join(ws.tmp_dir,runID,'metal.m8')
+	sym_out = os.path.join(ws.tmp_dir,runID,'sym.m8')
 
-	isdict = havalue('0.64',is_out)
-	vfdict = havalue('0.64',vf_out)
-	argdict = havalue('0.81',arg_out)
-	metaldict = havalue('0.64',metal_out)
-	popdict = havalue('0.64',pop_out)
-	symdict = havalue('0.64',sym_out)
 
-	dfdict = getdf(runID)
+	if not os.path.exists(os.path.join(ws.tmp_dir,runID,runID+'.locus_tag.faa')):
+		infaa = os.path.join(ws.gb_dir,runID+'.faa')
+		infa = os.path.join(ws.gb_dir,runID+'.ffn')
+	else:
+		infaa = os.path.join(ws.tmp_dir,runID,runID+'.locus_tag.faa')
+		infa = os.path.join(ws.tmp_dir,runID,runID+'.locus_tag.spaceHeader.ffn')
+
+	if genes is not None:
+		regfaa = os.path.join(ws.tmp_dir,runID,runID+'.region.faa')
+		regfa = os.path.join(ws.tmp_dir,runID,runID+'.region.ffn')
+		if not subset_fasta(infaa,regfaa,genes):
+			dfout = os.path.join(ws.tmp_dir,runID,'defense_'+runID)
+			if not os.path.exists(dfout):
+				os.makedirs(dfout)
+			for out in [is_out,vf_out,arg_out,metal_out,pop_out,sym_out,os.path.join(dfout,'defense_finder_genes.tsv')]:
+				open(out,'w').close()
+			return readblast(runID)
+		subset_fasta(infa,regfa,genes)
+		infaa,infa = regfaa,regfa
+
+	comb_out = os.path.join(ws.tmp_dir,runID,'protein_all.m8')
+	protdb = get_option('protdb','separate')
+	if protdb == 'merged':
+		searches = [[combblast,infaa,merged_Database,comb_out],[argblast,infa,arg_Database,arg_out]]
+	else:
+		searches = [[isblast,infaa,IS_Database,is_out],[vfblast,infaa,VF_Database,vf_out],[argblast,infa,arg_Database,arg_out],
+			    [metalblast,infaa,metal_Database,metal_out],[popblast,infaa,pop_Database,pop_out],[symblast,infaa,sym_Database,sym_out]]
+	if not threads:
+		threads = get_budget()[0]
+	nthread = max(1, threads // (len(searches)+1))
+
+	with ThreadPoolExecutor(max_workers=len(searches)+1) as pool:
+		futures = [pool.submit(cached_blast,blast,query,db,out,nthread) for blast,query,db,out in searches]
+		dffuture = pool.submit(getdf,runID,nthread,infaa)
+		for future in futures:
+			future.result()
+		dffuture.result()
+
+	if protdb == 'merged':
+		split_hits(comb_out,{'IS':is_out,'VF':vf_out,'metal':metal_out,'pop':pop_out,'sym':sym_out})
+
+	return readblast(runID)
+
+def oritblast(fa_file,orit_out,threads=8):
+	with lease(threads) as ncpu:
+		blast_cmd = [blastn, "-db", oriT_Database, "-query", fa_file, "-evalue", "0.01", "-word_size", "11", "-outfmt", "6 std qlen slen",
+			     "-num_alignments", "1", "-num_threads", ncpu, "-out", orit_out]
+		run(blast_cmd)
+
+def oritsearch(runID,regions,threads=8):
+
+	fafile = os.path.join(ws.tmp_dir,runID,runID+'_fororit.fa')
+	orit_out = os.path.join(ws.tmp_dir,runID,runID+'_oriTout')
+	if regions:
+		with open(fafile,'w') as orif:
+			for regi,seq in regions:
+				orif.write(">%s\n%s\n" % (regi,seq))
+		dbkey = make_key('oriT', stamp(blastn,oriT_Database), 'evalue 0.01 word_size 11')
+		search(oritblast,fafile,orit_out,threads,dbkey)
+	return readorit(runID,regions)
+
+def readorit(runID,regions):
+
+	orit_out = os.path.join(ws.tmp_dir,runID,runID+'_oriTout')
+	seqdict = dict(regions)
+	oritdict = dict((regi,'-') for regi,seq in regions)
+	if not regions:
+		return oritdict
+
+	with open(orit_out,'r') as oritout:
+		for line in oritout.readlines():
+			lines = line.strip().split()
+			if lines and oritdict.get(lines[0]) == '-':
+				matchl = int(lines[3])
+				slen = int(lines[13])
+				ident = float(lines[2])
+				hvalue = (matchl/slen)*ident
+				if hvalue > 0.49:
+					oritdict[lines[0]] = seqdict[lines[0]][int(lines[6])-1:int(lines[7])]
+	return oritdict
+
+def readblast(runID):
+
+	isdict = havalue('0.64',os.path.join(ws.tmp_dir,runID,'is.m8'))
+	vfdict = havalue('0.64',os.path.join(ws.tmp_dir,runID,'vf.m8'))
+	argdict = havalue('0.81',os.path.join(ws.tmp_dir,runID,'arg.m8'))
+	metaldict = havalue('0.64',os.path.join(ws.tmp_dir,runID,'metal.m8'))
+	popdict = havalue('0.64',os.path.join(ws.tmp_dir,runID,'pop.m8'))
+	symdict = havalue('0.64',os.path.join(ws.tmp_dir,runID,'sym.m8'))
+	dfdict = readdf(runID)
 
 	return argdict,vfdict,isdict,dfdict,metaldict,popdict,symdict
-
-
-
-
@@ -0,0 +1,93 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+strands = {'+':1, '-':-1, '.':0}
+rstrands = {1:'+', -1:'-', 0:'.'}
+
+class GeneTable:
+
+	def __init__(self, header):
+
+		self.header = header
+		self.ids = []
+		self.locus = []
+		self.products = []
+		self.starts = array('q')
+		self.ends = array('q')
+		self.strands = array('b')
+		self.nums = array('q')
+		self.maxends = array('q')
+		self.trnanums = array('q')
+		self.trnarows = array('q')
+		self.trnaspan = None
+		self.index = {}
+		self.totalnum = 0
+
+	def __len__(self):
+
+		return len(self.ids)
+
+	def add(self, num, gid, start, end, strand, product, locus='', trna=False):
+
+		row = len(self.ids)
+		self.ids.append(gid)
+		self.locus.append(locus or gid)
+		self.products.append(product)
+		self.starts.append(int(start))
+		self.ends.append(int(end))
+		self.strands.append(strands[strand])
+		self.nums.append(num)
+		self.maxends.append(max(int(end), self.maxends[-1]) if row else int(end))
+		self.index[num] = row
+		if trna:
+			self.trnanums.append(num)
+			self.trnarows.append(row)
+			self.trnaspan = None
+		self.totalnum = num
+
+	def gene(self, num):
+
+		return self.ids[self.index[num]]
+
+	def locus_tag(self, num):
+
+		return self.locus[self.index[num]]
+
+	def start(self, num):
+
+		return self.starts[self.index[num]]
+
+	def end(self, num):
+
+		return self.ends[self.index[num]]
+
+	def pos(self, num):
+
+		row = self.index[num]
+		return [str(self.starts[row]),str(self.ends[row]),rstrands[self.strands[row]],self.products[row]]
+
+	def locate(self, pos):
+
+		row = bisect_left(self.maxends, int(pos))
+		if row == len(self.ids):
+			return None
+		return self.nums[row],self.starts[row]
+
+	def trna_nums(self, fnum, enum):
+
+		return self.trnanums[bisect_left(self.trnanums, fnum):bisect_right(self.trnanums, enum)].tolist()
+
+	def count_trna(self, s, e):
+
+		if self.trnaspan is None:
+			span = sorted((self.starts[row],self.ends[row]) for row in self.trnarows)
+			self.trnaspan = [array('q', [x[0] for x in span]), array('q', [x[1] for x in span])]
+		tstarts,tends = self.trnaspan
+		count = 0
+		for i in range(bisect_left(tstarts, s), bisect_right(tstarts, e)):
+			if s <= tends[i] <= e:
+				count += 1
+		return count
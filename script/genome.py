@@ -0,0 +1,113 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,threading
+import numpy as np
+from collections import OrderedDict
+from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+cache = OrderedDict()
+lock = threading.Lock()
+maxcache = 16
+gcbases = np.frombuffer(b'GCSgcs', dtype=np.uint8)
+
+class Genome:
+
+	def __init__(self, seqid, seq, description='', features=None):
+
+		self.id = seqid
+		self.description = description
+		self.seq = str(seq)
+		self.features = features
+		self.gccum = None
+		self.useq = None
+
+	def __len__(self):
+
+		return len(self.seq)
+
+	def upper(self):
+
+		if self.useq is None:
+			self.useq = self.seq.upper()
+		return self.useq
+
+	def getfa(self, s, e):
+
+		return self.seq[int(s):int(e)]
+
+	def gc_index(self):
+
+		if self.gccum is None:
+			bases = np.frombuffer(self.seq.encode('ascii', 'replace'), dtype=np.uint8)
+			gccum = np.zeros(len(bases)+1, dtype=np.uint32)
+			np.cumsum(np.isin(bases, gcbases), dtype=np.uint32, out=gccum[1:])
+			self.gccum = gccum
+		return self.gccum
+
+	def gc_count(self, s, e):
+
+		gccum = self.gc_index()
+		s,e,step = slice(s,e).indices(len(self.seq))
+		if e <= s:
+			return 0,0
+		return int(gccum[e] - gccum[s]),e-s
+
+	def gc(self, start, end):
+
+		count,lengt = self.gc_count(start-1,end)
+		if not lengt:
+			return '0.00'
+		return str("%.2f"%(count*100.0/lengt))
+
+	def gc_windows(self, start, end, window_size, step_size):
+
+		gccum = self.gc_index()
+		s,e,step = slice(start-1,end).indices(len(self.seq))
+		idx = np.arange(s, e - window_size + 1, step_size)
+		if not len(idx):
+			return [],[]
+		gc_contents = ((gccum[idx+window_size] - gccum[idx]) * 100.0 / window_size).tolist()
+		steps = np.full(len(idx), step_size/1000.0)
+		steps[0] = start/1000 + step_size/2000.0
+		pos = [round(j, 4) for j in np.cumsum(steps).tolist()]
+		return pos,gc_contents
+
+	def write_region(self, outfa, s, e, seqid):
+
+		record = SeqRecord(Seq(self.seq[int(s)-1:int(e)]), id=seqid, description='')
+		with open(outfa, "w") as output_handle:
+			SeqIO.write(record, output_handle, "fasta")
+
+def put_genome(fasta_file, genome):
+
+	key = os.path.abspath(fasta_file)
+	stat = os.stat(key)
+	with lock:
+		cache[key] = [(stat.st_mtime_ns,stat.st_size),genome]
+		cache.move_to_end(key)
+		while len(cache) > maxcache:
+			cache.popitem(last=False)
+	return genome
+
+def drop_genomes(path):
+
+	prefix = os.path.join(os.path.abspath(path), '')
+	with lock:
+		for key in [key for key in cache if key.startswith(prefix)]:
+			del cache[key]
+
+def load_genome(fasta_file):
+
+	key = os.path.abspath(fasta_file)
+	stat = os.stat(key)
+	stamp = (stat.st_mtime_ns,stat.st_size)
+	with lock:
+		if key in cache and cache[key][0] == stamp:
+			cache.move_to_end(key)
+			return cache[key][1]
+
+	record = SeqIO.read(fasta_file, "fasta")
+	return put_genome(fasta_file, Genome(record.id, record.seq, record.description))
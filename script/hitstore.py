@@ -0,0 +1,103 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,sqlite3,hashlib
+from Bio import SeqIO
+from script.config import get_option
+from script.cache import get_cachedir
+
+chunk = 500
+
+def get_hitdb():
+
+	hitdb = get_option('hitdb', '')
+	if not hitdb and get_cachedir():
+		hitdb = os.path.join(get_cachedir(), 'hits.sqlite')
+	return hitdb
+
+def seq_hash(seq):
+
+	return hashlib.sha256(seq.upper().rstrip('*').encode()).hexdigest()
+
+def connect(hitdb):
+
+	if os.path.dirname(hitdb) and not os.path.exists(os.path.dirname(hitdb)):
+		os.makedirs(os.path.dirname(hitdb), exist_ok=True)
+	conn = sqlite3.connect(hitdb, timeout=600)
+	conn.execute('PRAGMA journal_mode=WAL')
+	conn.execute('CREATE TABLE IF NOT EXISTS hits (dbkey TEXT, seqhash TEXT, hit TEXT, PRIMARY KEY (dbkey, seqhash))')
+	return conn
+
+def lookup(hitdb, dbkey, hashes):
+
+	hashes = list(hashes)
+	known = {}
+	conn = connect(hitdb)
+	try:
+		for i in range(0, len(hashes), chunk):
+			part = hashes[i:i+chunk]
+			sql = 'SELECT seqhash, hit FROM hits WHERE dbkey = ? AND seqhash IN (' + ','.join('?'*len(part)) + ')'
+			for seqhash,hit in conn.execute(sql, [dbkey] + part):
+				known[seqhash] = hit
+	finally:
+		conn.close()
+	return known
+
+def save(hitdb, dbkey, hits):
+
+	conn = connect(hitdb)
+	try:
+		with conn:
+			conn.executemany('INSERT OR REPLACE INTO hits VALUES (?,?,?)', [(dbkey,seqhash,hit) for seqhash,hit in hits.items()])
+	finally:
+		conn.close()
+
+def search(blast, query, out, threads, dbkey):
+
+	hitdb = get_hitdb()
+	if not hitdb:
+		blast(query, out, threads)
+		return
+
+	records = [[record.id, str(record.seq)] for record in SeqIO.parse(query, "fasta")]
+	hashes = [seq_hash(seq) for seqid,seq in records]
+	known = lookup(hitdb, dbkey, set(hashes))
+
+	todo = {}
+	for [seqid,seq],seqhash in zip(records, hashes):
+		if seqhash not in known and seqhash not in todo:
+			todo[seqhash] = [seqid,seq]
+
+	if todo:
+		todo_fa = out + '.todo.fa'
+		todo_out = out + '.todo.m8'
+		with open(todo_fa, 'w') as todofa:
+			for seqid,seq in todo.values():
+				todofa.write(">%s\n%s\n" % (seqid,seq))
+		try:
+			blast(todo_fa, todo_out, threads)
+			if not os.path.isfile(todo_out):
+				raise RuntimeError('search produced no output: '+todo_out)
+		except BaseException:
+			for path in [todo_fa, todo_out, out]:
+				if os.path.isfile(path):
+					os.remove(path)
+			raise
+
+		rows = {}
+		with open(todo_out, 'r') as todoin:
+			for line in todoin:
+				lines = line.rstrip('\n').split('\t', 1)
+				if len(lines) == 2:
+					rows.setdefault(lines[0],[]).append(lines[1])
+		hits = dict((seqhash,'\n'.join(rows.get(seqid,[]))) for seqhash,[seqid,seq] in todo.items())
+		save(hitdb, dbkey, hits)
+		known.update(hits)
+		os.remove(todo_fa)
+		os.remove(todo_out)
+
+	with open(out, 'w') as outfile:
+		for [seqid,seq],seqhash in zip(records, hashes):
+			for hit in known[seqhash].split('\n'):
+				if hit:
+					outfile.write(seqid + '\t' + hit + '\n')
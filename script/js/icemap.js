@@ -0,0 +1,8 @@
+var borders = [];
+var tta_codons = [];
+var jsonData = iceData.gc;
+var clusterf2 = { start: iceData.start, end: iceData.end, idx: 1, orfs: iceData.orfs, borders: borders, tta_codons: tta_codons,
+		  label: '', unordered: true };
+var clusterr2 = { start: iceData.start, end: iceData.end, idx: 2, orfs: iceData.orfs2, borders: borders, tta_codons: tta_codons,
+		  label: '', unordered: true };
+svgene.drawClusters(iceData.id, [clusterf2, clusterr2], 50, 920);
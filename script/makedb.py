@@ -0,0 +1,67 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,sys
+from script.config import get_param, get_search
+from script.runner import run
+
+param = get_param()
+workdir = param[0]
+blastp = param[4]
+mmseqs,diamond = get_search()
+blastdbcmd = os.path.join(os.path.dirname(blastp), 'blastdbcmd')
+makeblastdb = os.path.join(os.path.dirname(blastp), 'makeblastdb')
+
+databases = [['transposase','prot'],['virulence','prot'],['resfinder','nucl'],
+	     ['metal','prot'],['degradation','prot'],['symbiosis','prot']]
+tags = {'transposase':'IS','virulence':'VF','metal':'metal','degradation':'pop','symbiosis':'sym'}
+
+def dump_fasta(db,dbtype):
+
+	fasta = db+'.fasta'
+	if not os.path.exists(fasta):
+		cmd = [blastdbcmd, '-db', db, '-dbtype', dbtype, '-entry', 'all', '-out', fasta]
+		run(cmd)
+	return fasta
+
+def merge_fasta():
+
+	merged = os.path.join(workdir,'data','protein_all')
+	with open(merged+'.fasta','w') as outfa:
+		for name,dbtype in databases:
+			if name not in tags:
+				continue
+			fasta = dump_fasta(os.path.join(workdir,'data',name),dbtype)
+			with open(fasta,'r') as fain:
+				for line in fain:
+					if line.startswith('>'):
+						line = '>' + tags[name] + '~' + line[1:]
+					outfa.write(line)
+	return merged
+
+def makedb(backend):
+
+	merged = merge_fasta()
+	if backend == 'blast':
+		print('Building blast database: protein_all')
+		run([makeblastdb, '-in', merged+'.fasta', '-dbtype', 'prot', '-parse_seqids', '-out', merged])
+		return
+
+	for name,dbtype in databases+[['protein_all','prot']]:
+		db = os.path.join(workdir,'data',name)
+		fasta = dump_fasta(db,dbtype)
+		if backend == 'diamond' and dbtype == 'prot':
+			cmd = [diamond, 'makedb', '--quiet', '--in', fasta, '-d', db]
+		elif backend == 'mmseqs':
+			cmd = [mmseqs, 'createdb', fasta, db+'.mmseqs', '--dbtype', '1' if dbtype == 'prot' else '2', '-v', '1']
+		else:
+			continue
+		print('Building '+backend+' database: '+name)
+		run(cmd)
+
+if __name__ == '__main__':
+
+	if len(sys.argv) != 2 or sys.argv[1] not in ['blast','diamond','mmseqs']:
+		print('Usage: python -m script.makedb blast|diamond|mmseqs')
+		sys.exit(1)
+	makedb(sys.argv[1])
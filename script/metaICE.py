@@ -1,15 +1,24 @@
 #!/public/wangm/miniconda3/bin/python
 # -*- coding: utf-8 -*-
 
-import os,time
+import os,re,time
 import random,json
 import string,shutil
 from Bio import SeqIO
-from ete3 import NCBITaxa
-from Bio.SeqUtils import GC
+from Bio.Seq import reverse_complement
 from functools import cmp_to_key
-from script.function import getblast
-from script.config import get_param
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from script.function import getblast, region_genes, oritsearch
+from script.config import get_param, get_option
+from script.genome import load_genome
+from script.genetable import GeneTable
+from script.drsearch import local_DR, vmatch_DR
+from script.taxonomy import resolve
+from script.cache import make_key, file_hash, fasta_hash, stamp, fetch, clear, store, relabel_gff
+from script.scheduler import lease, db_memory, get_budget
+from script.runner import run, stream
+from script.render import render_ice
+from script import workspace as ws
 
 param = get_param()
 workdir = param[0]
@@ -23,16 +32,13 @@ prokka = param[8]
 macsyfinder = param[9]
 hmmsearch = param[10]
 
-tmp_dir = os.path.join(workdir,'tmp') 
-in_dir = os.path.join(tmp_dir,'fasta')
-gb_dir = os.path.join(tmp_dir,'gbk')
 
 def rename(runID, infile):
-	run_dir = os.path.join(tmp_dir,runID)
+	run_dir = os.path.join(ws.tmp_dir,runID)
 	if not os.path.exists(run_dir):
 		os.makedirs(run_dir)
-	if not os.path.exists(gb_dir):
-		os.mkdir(gb_dir)
+	if not os.path.exists(ws.gb_dir):
+		os.mkdir(ws.gb_dir)
 
 	filename = os.path.basename(infile)
 	resultf = filename.rsplit('.', 1)[0]
@@ -40,6 +46,7 @@ def rename(runID, infile):
 
 	i = 1
 	id_dict = {}
+	full_dict = {}
 	newIDfa = os.path.join(run_dir,runID+'_newID.fa')
 	newfa = open(newIDfa,'w')
 
@@ -49,88 +56,116 @@ def rename(runID, infile):
 		else:
 			realID = seq_record.id
 		contigID = 'contig_' + str(i)
+		full_dict[seq_record.id] = contigID
 		seq_record.id = contigID
 		seqfa = str(seq_record.seq)
 		newfa.write(">%s\n%s\n" % (contigID,seqfa))
 		id_dict[contigID] = realID
 		i += 1
-	return id_dict
+	return id_dict,full_dict
 
 def get_time():
 
 	return time.asctime( time.localtime(time.time()) )
 
-def Taxonomy(runID):
+def Taxonomy(runID,contigs=None):
 
-	newIDfa = os.path.join(tmp_dir,runID,runID+'_newID.fa')
-	report = os.path.join(tmp_dir,runID,runID+'_kraken.report')
-	output = os.path.join(tmp_dir,runID,runID+'_kraken.output')
-	drawout = os.path.join(tmp_dir,runID,'kraken.html')
+	newIDfa = os.path.join(ws.tmp_dir,runID,runID+'_newID.fa')
+	if contigs is not None:
+		newIDfa = os.path.join(ws.tmp_dir,runID,runID+'_taxa.fa')
+		with open(newIDfa,'w') as outfa:
+			for contigID,seqfa in contigs:
+				outfa.write(">%s\n%s\n" % (contigID,seqfa))
+	report = os.path.join(ws.tmp_dir,runID,runID+'_kraken.report')
+	drawout = os.path.join(ws.tmp_dir,runID,'kraken.html')
 
-	annocmd = "{} {} {} {} {} {} {} {} {}".format(kraken,"--db",krakenDB,"--report",\
-		report,"--output",output,newIDfa,'>/dev/null')
-	os.system(annocmd)
+	with lease(8,db_memory(krakenDB)) as ncpu:
+		annocmd = [kraken,"--db",krakenDB,"--threads",ncpu,"--report",report,"--output","-",newIDfa]
+		taxdict = read_taxids(stream(annocmd))
 #	drawcmd = ' '.join(['/opt/R/3.6.3/bin/Rscript', './script/sankey.R', report, drawout, '>/dev/null'])
 #	os.system(drawcmd)
 
-	spdict = {}
-	with open(output,'r') as taxainfo:
-		for line in taxainfo.readlines():
-			lines = line.strip().split('\t')
-			ID,taxid = lines[1],lines[2]
-			if taxid == '0':
-				spdict[ID] = '-'
-			else:
-				spname,strainame = get_ranks(taxid)
-				spdict[ID] = spname
+	spdict = get_species(taxdict)
 
 	return drawout,spdict,report
 
-def get_ranks(taxid):
-	ncbi = NCBITaxa()
-	lineage = ncbi.get_lineage(taxid)   
-	names = ncbi.get_taxid_translator(lineage)
-	lineage2ranks = ncbi.get_rank(names)
-	ranks2lineage = dict((rank,taxid) for (taxid, rank) in lineage2ranks.items())
-
-	strainid = ''
-	if 'species' in ranks2lineage:
-		spid = ranks2lineage['species']
-		if 'strain' in ranks2lineage:
-			strainid = ranks2lineage['strain']
+def read_taxids(taxainfo):
+
+	taxdict = {}
+	for line in taxainfo:
+		lines = line.strip().split('\t')
+		if len(lines) > 2:
+			ID,taxid = lines[1],lines[2]
+		elif len(lines) == 2:
+			ID,taxid = lines
+		else:
+			continue
+		taxa = re.search(r'taxid (\d+)', taxid)
+		if taxa:
+			taxid = taxa.group(1)
+		taxdict[ID] = taxid
+	return taxdict
+
+def get_species(taxdict):
+
+	namedict = resolve([taxid for taxid in taxdict.values() if taxid != '0'])
+	spdict = {}
+	for ID,taxid in taxdict.items():
+		if taxid == '0':
+			spdict[ID] = '-'
 		else:
-			strainid = ''
-	elif 'genus' in ranks2lineage:
-		spid = ranks2lineage['genus']
-		strainid = ''
-	elif 'phylum' in ranks2lineage:
-		spid = ranks2lineage['phylum']
-		strainid = ''
+			spdict[ID] = namedict[taxid][0]
+	return spdict
+
+def user_taxa(taxfile,full_dict):
 
-	try:
-		spname = list(ncbi.get_taxid_translator([spid]).values())[0]
-	except:
-		spname = '-'
+	taxdict = {}
+	with open(taxfile,'r') as taxainfo:
+		taxids = read_taxids(taxainfo)
+	for ID,taxid in taxids.items():
+		if ID in full_dict:
+			taxdict[full_dict[ID]] = taxid
+	return get_species(taxdict)
 
-	strainame = ''
-	if strainid:
-		strainame = list(ncbi.get_taxid_translator([strainid]).values())[0]
+def set_info(sprunID,regidict):
 
-	return spname,strainame
+	final_dir = os.path.join(ws.tmp_dir,sprunID,'result')
+	for regi,fields in regidict.items():
+		infofile = os.path.join(final_dir,regi+'_info.json')
+		with open(infofile,'r') as info_file:
+			ICEinfo = json.load(info_file)
+		ICEinfo.update(fields)
+		with open(infofile,'w') as info_file:
+			json.dump(ICEinfo, info_file, indent=4)
+
+def orit(runID,contigs,ICEres):
+
+	regions = []
+	for contigID,seqfa in contigs:
+		sprunID = runID + '_' + contigID
+		fasta_file = os.path.join(ws.tmp_dir, sprunID, sprunID+'.fa')
+		for regi,value in ICEres[contigID].items():
+			[s,e,stag,etag] = value.split('|')
+			regions.append([regi,getfa(fasta_file,s,e)])
+
+	oritdict = oritsearch(runID,regions)
+	for contigID,seqfa in contigs:
+		if ICEres[contigID]:
+			set_info(runID+'_'+contigID,dict((regi,{'oriT seq':oritdict[regi]}) for regi in ICEres[contigID]))
 
 def getbase(runID):
 
-	newIDfa = os.path.join(tmp_dir, runID, runID+'_newID.fa')
-	statcmd = ' '.join([seqkit,"stats","-a",newIDfa])
-	stats = os.popen(statcmd, "r")
-	for line in stats.readlines():
+	newIDfa = os.path.join(ws.tmp_dir, runID, runID+'_newID.fa')
+	with lease(1) as ncpu:
+		stats = list(stream([seqkit,"stats","-a","-j",ncpu,newIDfa]))
+	for line in stats:
 		lines = line.strip().split()
 		if lines[0] != 'file':
 			lengt = lines[4]
 			count = lines[3]
 			n50 = lines[12]
 
-	basefile = os.path.join(tmp_dir,runID, runID+'_info.json')
+	basefile = os.path.join(ws.tmp_dir,runID, runID+'_info.json')
 	basedict = {'JobID':runID,
 		    'Submission date':get_time(),
 		    'Total length': lengt+' bp',
@@ -144,50 +179,16 @@ def getbase(runID):
 
 def gc(fasta_file,start,end):
 
-	record = SeqIO.read(fasta_file, "fasta")
-	sequence = record.seq[start-1:end]
-	gcs = str("%.2f"%GC(sequence))
-
-	return gcs
-
-def calculate_gc(fasta_file, start, end, window_size, step_size):
-
-	record = SeqIO.read(fasta_file, "fasta")
-	if start == 0:
-		start = 1
-	sequence = record.seq[start-1:end]
-
-	windows = []
-	gc_contents = []
-	pos = []
-	j = start/1000 + 0.025
-	for i in range(0, len(sequence) - window_size + 1, step_size):
-		window = sequence[i:i+window_size]
-		gc_content = GC(window)
-		gc_contents.append(gc_content)
-		pos.append(round(j, 4))
-		j += 0.05
-
-	gcdict = {
-		        'xData':pos,
-		        'datasets':[{
-		            'name':'',
-		            'data':gc_contents,
-		            'unit':'%',
-		            'type':'line',
-		            "valueDecimals": 1
-		        }]
-	    }
-
-	return gcdict
+	return load_genome(fasta_file).gc(start,end)
 
 def preanno(runID):
 
-	newIDfa = os.path.join(tmp_dir, runID, runID+'_newID.fa')
-	anno_fa = os.path.join(tmp_dir, runID, runID + '.faa')
-	anno_gff = os.path.join(tmp_dir, runID, runID + '.gff')
-	anno_cmd = prodigal +' -c -m -q -p meta -f gff -i ' + newIDfa + ' -a ' + anno_fa + ' -o ' + anno_gff
-	os.system(anno_cmd)
+	newIDfa = os.path.join(ws.tmp_dir, runID, runID+'_newID.fa')
+	anno_fa = os.path.join(ws.tmp_dir, runID, runID + '.faa')
+	anno_gff = os.path.join(ws.tmp_dir, runID, runID + '.gff')
+	anno_cmd = [prodigal,'-c','-m','-q','-p','meta','-f','gff','-i',newIDfa,'-a',anno_fa,'-o',anno_gff]
+	with lease(1):
+		run(anno_cmd)
 
 def scanf(hmmlist):
 
@@ -210,15 +211,13 @@ def scanf(hmmlist):
 
 def prescan(runID):
 	preanno(runID)
-	anno_fa = os.path.join(tmp_dir, runID, runID + '.faa')
-	scanfile = os.path.join(tmp_dir, runID, runID + '_prescan')
-	scancmd = [ './tool/hmmscan2', '--tblout', scanfile, './data/ICEscan.hmm', anno_fa, '> /dev/null']
-	os.system(' '.join(scancmd))
+	anno_fa = os.path.join(ws.tmp_dir, runID, runID + '.faa')
 
 	icedict = {}
 	chosen = []
-	with open(scanfile, 'r') as outfile:
-		for line in outfile.readlines():
+	with lease(2) as ncpu:
+		scancmd = ['./tool/hmmscan2', '--cpu', ncpu, '-o', '/dev/null', '--tblout', '/dev/stdout', './data/ICEscan.hmm', anno_fa]
+		for line in stream(scancmd):
 			if not line.startswith('#'):
 				lines = line.strip().split()
 				if lines[2] in icedict:
@@ -236,37 +235,179 @@ def prescan(runID):
 
 	return chosen
 
-def prokkanno(runID,infile):
+def prokkanno(runID,infile,cpus=8,metagenome=False):
+
+	annofiles = dict((ext,os.path.join(ws.gb_dir, runID + '.' + ext)) for ext in ['gff','faa','ffn'])
+	key = make_key(fasta_hash(infile), stamp(prokka), 'fast cdsrnaolap')
+	if not metagenome and fetch('prokka',key,annofiles):
+		relabel_gff(annofiles['gff'],runID)
+		return
 
-	cmd = [prokka,infile,"--force","--fast --quiet --cdsrnaolap --cpus 8 ","--outdir",gb_dir,"--prefix",runID]
-	os.system(' '.join(cmd))
+	clear(annofiles)
+	with lease(cpus) as ncpu:
+		cmd = [prokka,infile,"--force","--fast","--quiet","--cdsrnaolap","--cpus",ncpu,"--outdir",ws.gb_dir,"--prefix",runID]
+		if metagenome:
+			cmd.append("--metagenome")
+		run(cmd)
+	if not metagenome:
+		store('prokka',key,annofiles)
+
+def split_anno(poolID,sprunIDs):
+
+	gffile = os.path.join(ws.gb_dir, poolID + '.gff')
+	iddict = {}
+	gffdict = {sprunID:[] for sprunID in sprunIDs}
+	with open(gffile,'r') as gffin:
+		for line in gffin.readlines():
+			if line.startswith('##FASTA'):
+				break
+			lines = line.strip().split('\t')
+			if lines[0] in gffdict and len(lines) > 8 and 'ID=' in lines[8]:
+				ids = lines[8].split(';')[0].split('=')[1]
+				newid = zill(ids.split('_')[0],len(gffdict[lines[0]])+1)
+				iddict[ids] = [lines[0],newid]
+				gffdict[lines[0]].append(re.sub(re.escape(ids)+r'\b',newid,line))
+
+	for sprunID,gfflines in gffdict.items():
+		with open(os.path.join(ws.gb_dir, sprunID + '.gff'),'w') as gffout:
+			gffout.writelines(gfflines)
+
+	for ext in ['.faa','.ffn']:
+		outdict = {sprunID:open(os.path.join(ws.gb_dir, sprunID + ext),'w') for sprunID in sprunIDs}
+		with open(os.path.join(ws.gb_dir, poolID + ext),'r') as seqin:
+			outfile = None
+			for line in seqin:
+				if line.startswith('>'):
+					ids = line[1:].split()[0]
+					if ids in iddict:
+						sprunID,newid = iddict[ids]
+						outfile = outdict[sprunID]
+						line = '>' + newid + line[1+len(ids):]
+					else:
+						outfile = None
+				if outfile:
+					outfile.write(line)
+		for outfile in outdict.values():
+			outfile.close()
+
+def write_pool(runID,contigs):
+
+	poolfa = os.path.join(ws.tmp_dir, runID, runID + '_pool.fa')
+	with open(poolfa,'w') as outfa:
+		for contigID,seqfa in contigs:
+			outfa.write(">%s\n%s\n" % (runID + '_' + contigID,seqfa))
+	return poolfa
+
+def poolanno(runID,contigs):
+
+	poolID = runID + '_pool'
+	poolfa = write_pool(runID,contigs)
+	sprunIDs = [runID + '_' + contigID for contigID,seqfa in contigs]
+
+	prokkanno(poolID,poolfa,get_budget()[0],True)
+	split_anno(poolID,sprunIDs)
+
+def trnascan(poolfa):
+
+	with lease(1):
+		araout = list(stream(['./tool/aragorn', '-l', '-gc11', '-w', poolfa]))
+
+	trnadict = {}
+	sid = ''
+	for line in araout:
+		if line.startswith('>'):
+			sid = line[1:].split()[0]
+			continue
+		lines = line.strip().split()
+		if len(lines) != 5 or not lines[0].isdigit() or '?' in lines[1]:
+			continue
+		loc = re.match(r'(c)?\[-?(\d+),(\d+)\]', lines[2])
+		if not loc:
+			continue
+		start,end = max(1,int(loc.group(2))),int(loc.group(3))
+		if start > end or end - start > 500:
+			continue
+		strand = '-' if loc.group(1) else '+'
+		if lines[1].startswith('tmRNA'):
+			trnadict.setdefault(sid,[]).append([start,end,strand,'tmRNA','transfer-messenger RNA, SsrA',''])
+		else:
+			trnadict.setdefault(sid,[]).append([start,end,strand,'tRNA',lines[1]+lines[4],''])
+	return trnadict
+
+def prodanno(runID,contigs):
+
+	anno_fa = os.path.join(ws.tmp_dir, runID, runID + '.faa')
+	anno_gff = os.path.join(ws.tmp_dir, runID, runID + '.gff')
+	chosen = [contigID for contigID,seqfa in contigs]
+
+	genedict = {}
+	with open(anno_gff,'r') as gffin:
+		for line in gffin.readlines():
+			lines = line.strip().split('\t')
+			if lines[0] in chosen and len(lines) > 8:
+				protid = lines[0] + '_' + lines[8].split(';')[0].split('_')[-1]
+				genedict.setdefault(lines[0],[]).append([int(lines[3]),int(lines[4]),lines[6],'CDS','hypothetical protein',protid])
+
+	protdict = {}
+	for faa_record in SeqIO.parse(anno_fa, "fasta"):
+		if '_'.join(faa_record.id.split('_')[:-1]) in genedict:
+			protdict[faa_record.id] = str(faa_record.seq).rstrip('*')
+
+	trnadict = trnascan(write_pool(runID,contigs))
+	for contigID,seqfa in contigs:
+		sprunID = runID + '_' + contigID
+		header = contigID.replace('_','')
+		feats = genedict.get(contigID,[]) + trnadict.get(sprunID,[])
+		feats.sort(key=lambda x: x[0])
+		with open(os.path.join(ws.gb_dir, sprunID + '.gff'),'w') as gffout, \
+		     open(os.path.join(ws.gb_dir, sprunID + '.faa'),'w') as faaout, \
+		     open(os.path.join(ws.gb_dir, sprunID + '.ffn'),'w') as ffnout:
+			for i,[s,e,strand,ftype,product,protid] in enumerate(feats, 1):
+				ids = zill(header,i)
+				if ftype == 'CDS':
+					source,phase = 'Prodigal:2.6','0'
+				else:
+					source,phase = 'Aragorn:1.2','.'
+				gffout.write('\t'.join([sprunID,source,ftype,str(s),str(e),'.',strand,phase,'ID='+ids+';locus_tag='+ids+';product='+product])+'\n')
+				seq = seqfa[s-1:e]
+				if strand == '-':
+					seq = reverse_complement(seq)
+				ffnout.write(">%s %s\n%s\n" % (ids,product,seq))
+				if protid in protdict:
+					faaout.write(">%s %s\n%s\n" % (ids,product,protdict[protid]))
 
 def ICEscan(runID):
 
-	anno_fa = os.path.join(gb_dir, runID + '.faa')
-	ICE_res = os.path.join(tmp_dir, runID, runID + '_ICE')
-	ICE_cmd = macsyfinder + ' --db-type ordered_replicon --hmmer '+ hmmsearch + ' --models-dir ./data/macsydata/ --models ICEscan all --replicon-topology linear --coverage-profile 0.3 --sequence-db '+ anno_fa+ ' -o ' + ICE_res + ' > /dev/null'
-	os.system(ICE_cmd)
+	anno_fa = os.path.join(ws.gb_dir, runID + '.faa')
+	ICE_res = os.path.join(ws.tmp_dir, runID, runID + '_ICE')
+	sysfiles = {'all_systems.tsv':os.path.join(ICE_res,'all_systems.tsv')}
+	key = make_key(file_hash(anno_fa), stamp(macsyfinder,hmmsearch,'./data/macsydata'), 'ICEscan all linear 0.3')
+	if fetch('ICEscan',key,sysfiles):
+		return
+
+	clear(sysfiles)
+	with lease(8) as ncpu:
+		ICE_cmd = [macsyfinder,'--db-type','ordered_replicon','--hmmer',hmmsearch,'-w',ncpu,'--models-dir','./data/macsydata/',
+			   '--models','ICEscan','all','--replicon-topology','linear','--coverage-profile','0.3','--sequence-db',anno_fa,'-o',ICE_res]
+		run(ICE_cmd)
+	store('ICEscan',key,sysfiles)
 
 def getgff(runID):
 
-	gffile = os.path.join(gb_dir, runID + '.gff')
+	gffile = os.path.join(ws.gb_dir, runID + '.gff')
+	table = None
 	with open(gffile,'r') as gffin:
-		trnadict = {}
-		posdict = {}
 		for line in gffin.readlines():
 			if 'ID=' in line:
 				lines = line.strip().split('\t')
 				ids = lines[8].split(';')[0].split('=')[1]
-				header = ids.split('_')[0]
+				if table is None:
+					table = GeneTable(ids.split('_')[0])
 				product = lines[8].split('product=')[1]
-				pos = [lines[3],lines[4],lines[6],product]
-				if lines[2] == 'tRNA' or lines[2] == 'tmRNA':
-					trnadict[ids] = product
-				posdict[ids] = pos
-				totalnum = getnum(ids)
+				istrna = lines[2] == 'tRNA' or lines[2] == 'tmRNA'
+				table.add(getnum(ids),ids,lines[3],lines[4],lines[6],product,trna=istrna)
 
-	return trnadict,posdict,header,totalnum
+	return table
 
 def getnum(ID):
 
@@ -287,28 +428,27 @@ def find_max_distance(numbers):
 
 	return numbers[max_distance_index], numbers[max_distance_index + 1]
 
-def pos_tag(pos,posdict,ICE,final,totalnum,dirtag):
+def pos_tag(pos,table,ICE,final,dirtag):
 
 	tICE = ICE
 	tfinal = final
-	for k,v in posdict.items():
-		vstart,vend = int(v[0]),int(v[1])
-		if int(pos) <= vend:
-			if dirtag == 's':
-				tICE = getnum(k)
-				tfinal = max(1, tICE - 5)
+	hit = table.locate(pos)
+	if hit:
+		num,vstart = hit
+		if dirtag == 's':
+			tICE = num
+			tfinal = max(1, tICE - 5)
+		else:
+			if vstart > pos:
+				tICE = num - 1 
 			else:
-				if vstart > int(pos):
-					tICE = getnum(k) - 1 
-				else:
-					tICE = getnum(k)
-				tfinal = min(totalnum, tICE + 5)
-			break
+				tICE = num
+			tfinal = min(table.totalnum, tICE + 5)
 	return tICE, tfinal
 
-def merge_tRNA(runID,ICEdict,DRlist):
+def merge_tRNA(runID,ICEdict,DRlist,table,infile):
 
-	trnadict,posdict,header,totalnum = getgff(runID)
+	totalnum = table.totalnum
 	fICE = getnum(next(iter(ICEdict)))
 	eICE = getnum(list(ICEdict.keys())[-1])
 
@@ -317,96 +457,71 @@ def merge_tRNA(runID,ICEdict,DRlist):
 
 	ICEtagnum = [nfICEnum,neICEnum]
 	trnalist = []
-	for key,value in trnadict.items():
-		if nfICEnum <= getnum(key) <= neICEnum:
-			ICEtagnum.append(getnum(key))
-			trnalist.append(value)
+	for num in table.trna_nums(nfICEnum,neICEnum):
+		ICEtagnum.append(num)
+		trnalist.append(table.pos(num)[3])
 
 	ICEtagnum.sort()
 	finalstart,finalend = find_max_distance(ICEtagnum)
 
-	myDR1 = posdict[zill(header,fICE)][0]
+	myDR1 = str(table.start(fICE))
 	myDR2 = ''
 	myDR3 = ''
-	myDR4 = posdict[zill(header,eICE)][1]
+	myDR4 = str(table.end(eICE))
 
 	if trnalist:
 		if finalstart == nfICEnum:
 			eICE = finalend
 			finalend = min(totalnum, finalend + 5)
-			myDR4 = posdict[zill(header,eICE)][1]					
-			for line in DRlist:
-				DRs = line.split('|')
-				if int(DRs[3]) - int(DRs[0]) > 500000:
+			myDR4 = str(table.end(eICE))
+			if DRlist is None:
+				DRlist = local_DR(infile,table.start(eICE),table.end(eICE),'e',0)
+			for DRs in DRlist:
+				if DRs[3] - DRs[0] > 500000:
 					continue
-				if int(DRs[3]) - int(DRs[0]) < 5000:
+				if DRs[3] - DRs[0] < 5000:
 					continue					
-				if int(posdict[zill(header,eICE)][0]) < int(DRs[3]) < int(posdict[zill(header,eICE)][1]):
-					checktrna = 0
-					for key,value in trnadict.items():
-						if int(DRs[0]) <= value[0] <= int(DRs[3]) and int(DRs[0]) <= value[1] <= int(DRs[3]):
-							checktrna += 1
-					if checktrna >= 2:
+				if table.start(eICE) < DRs[3] < table.end(eICE):
+					if table.count_trna(DRs[0],DRs[3]) >= 2:
 						break
 
-					fICE,finalstart = pos_tag(DRs[0],posdict,fICE,finalstart,totalnum,'s')
-					myDR1 = DRs[0]
-					myDR2 = DRs[1]
-					myDR3 = DRs[2]
-					myDR4 = DRs[3]
+					fICE,finalstart = pos_tag(DRs[0],table,fICE,finalstart,'s')
+					myDR1,myDR2,myDR3,myDR4 = [str(x) for x in DRs]
 					break
 
 		elif finalend == neICEnum:
 			fICE = finalstart
 			finalstart =  max(1, finalstart - 5)
-			myDR1 = posdict[zill(header,fICE)][0]
-			for line in DRlist:
-				DRs = line.split('|')
-				if int(DRs[3]) - int(DRs[0]) > 500000:
+			myDR1 = str(table.start(fICE))
+			if DRlist is None:
+				DRlist = local_DR(infile,table.start(fICE),table.end(fICE),'s',0)
+			for DRs in DRlist:
+				if DRs[3] - DRs[0] > 500000:
 					continue	
-				if int(DRs[3]) - int(DRs[0]) < 5000:
+				if DRs[3] - DRs[0] < 5000:
 					continue									
-				if int(posdict[zill(header,fICE)][0]) < int(DRs[0]) < int(posdict[zill(header,fICE)][1]):
-					checktrna = 0
-					for key,value in trnadict.items():
-						if int(DRs[0]) <= value[0] <= int(DRs[3]) and int(DRs[0]) <= value[1] <= int(DRs[3]):
-							checktrna += 1
-					if checktrna >= 2:
+				if table.start(fICE) < DRs[0] < table.end(fICE):
+					if table.count_trna(DRs[0],DRs[3]) >= 2:
 						break
-					eICE,finalend = pos_tag(DRs[3],posdict,eICE,finalend,totalnum,'e')
-					myDR1 = DRs[0]
-					myDR2 = DRs[1]
-					myDR3 = DRs[2]
-					myDR4 = DRs[3]									
+					eICE,finalend = pos_tag(DRs[3],table,eICE,finalend,'e')
+					myDR1,myDR2,myDR3,myDR4 = [str(x) for x in DRs]
 					break
 
-	return myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,posdict,header,trnalist
+	return myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,trnalist
 
 def get_DR(runID,infile):
 
-	DRindex = os.path.join(tmp_dir, runID, runID+'_DR')
-	DRout = os.path.join(tmp_dir, runID, runID+'_DRout')
-	maktree_cmd = './tool/mkvtree -db ' + infile +' -indexname '+ DRindex +' -dna -pl -lcp -suf -tis -ois -bwt -bck -sti1'
-	vmatch_cmd = './tool/vmatch -l 15 '+ DRindex + ' > '+ DRout
-	os.system(maktree_cmd)
-	os.system(vmatch_cmd)
-
-	DRlist = []
-	with open(DRout,'r') as DRin:
-		for line in DRin.readlines():
-			lines = line.strip().split()
-			if not line.startswith('#'):
-				DR = [lines[2],str(int(lines[2])+int(lines[0])),lines[6],str(int(lines[6])+int(lines[4]))]
-				DRlist.append('|'.join(DR))
-	return DRlist
+	DRindex = os.path.join(ws.tmp_dir, runID, runID+'_DR')
+	DRout = os.path.join(ws.tmp_dir, runID, runID+'_DRout')
+	return vmatch_DR(infile,DRindex,DRout,0)
 
 def get_ICE(runID,infile):
 
-	ICE_dir = os.path.join(tmp_dir, runID, runID + '_ICE')
+	ICE_dir = os.path.join(ws.tmp_dir, runID, runID + '_ICE')
 	ICE_res = os.path.join(ICE_dir,'all_systems.tsv')
 
 	if os.path.exists(ICE_dir):
-		os.system('rm -r ' + ICE_dir)
+		shutil.rmtree(ICE_dir)
 	ICEscan(runID)
 
 	with open(ICE_res,'r') as ICEin:
@@ -438,19 +553,25 @@ def get_ICE(runID,infile):
 						infodict[ICEtag]['mpf'].append(mpf)	
 
 	dictICE = {}
-	posdict = {}
-	trnalist = []
-	header = ''
-	DRlist = get_DR(runID,infile)
+	table = getgff(runID)
+	if get_option('drsearch','local') == 'vmatch':
+		DRlist = get_DR(runID,infile)
+	else:
+		DRlist = None
 	for key,value in ICEdict.items():
-		myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,posdict,header,trnalist = merge_tRNA(runID,value,DRlist)
-		dictICE[key] = [myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend]
+		dictICE[key] = list(merge_tRNA(runID,value,DRlist,table,infile))
+
+	return dictICE,ICEdict,table,infodict
 
-	return dictICE,ICEdict,posdict,header,trnalist,infodict
+def args(runID,dictICE,table):
 
-def args(runID):
+	return getblast(runID,genes=homology_genes(dictICE,table))
 
-	return getblast(runID)
+def homology_genes(dictICE,table):
+
+	if get_option('homology','genome') == 'region':
+		return region_genes(dictICE,table)
+	return None
 
 def zill(header,num):
 
@@ -489,33 +610,6 @@ def get_args(argdict,vfdict,isdict,dfdict,metaldict,popdict,symdict,gene,feature
 
 	return feature,product
 
-def oritseq(runID, regi, infile, start, end):
-
-	oritseq = '-'
-	fafile = os.path.join(tmp_dir,runID,regi+'_fororit.fa')	
-	with open(fafile,'w') as orif:
-		seq = getfa(infile,start,end)
-		orif.write('>fororit\n')
-		orif.write(seq)
-
-	oriT_Database = os.path.join(workdir,'data','oriT_db')
-	blastn_out = os.path.join(tmp_dir,runID,regi+'_oriTout')
-	blast_cmd = [blastn, "-db", oriT_Database, "-query", fafile, "-evalue 0.01 -word_size 11 -outfmt '6 std qlen slen' -num_alignments 1 -out", blastn_out,">/dev/null"]
-	os.system(' '.join(blast_cmd))
-
-	with open(blastn_out,'r') as oritout:
-		for line in oritout.readlines():
-			lines = line.strip().split()
-			if lines[0]:
-				matchl = int(lines[3])
-				slen = int(lines[13])
-				ident = float(lines[2])
-				hvalue = (matchl/slen)*ident	
-				if hvalue > 0.49:
-					oritseq = getfa(fafile,str(int(lines[6])-1),lines[7])
-					break
-	return oritseq
-
 def get_feat(feat):
 
 	featuredict = {
@@ -599,22 +693,19 @@ def gstrand(instra):
 
 def getfa(infile,s,e):
 
-	seq_record = SeqIO.read(infile, "fasta")
-	sequence = seq_record.seq[int(s):int(e)]
-	return str(sequence)
+	return load_genome(infile).getfa(s,e)
 
 def get_map(sprunID,spdict,id_dict):
 
-	final_dir = os.path.join(workdir,'tmp',sprunID,'result')
+	final_dir = os.path.join(ws.tmp_dir,sprunID,'result')
 	js_dir = os.path.join(final_dir,'js')
-	if not os.path.exists(js_dir): 
+	headless = get_option('output','full') == 'headless'
+	if not headless and not os.path.exists(js_dir): 
 		os.makedirs(js_dir)
-	gcmap = os.path.join(workdir,'script','js','gcmap.js')
-	viewfile = os.path.join(workdir,'script','js','view.html')
 
-	fasta_file = os.path.join(tmp_dir, sprunID, sprunID+'.fa')
-	dictICE,ICEdict,posdict,header,trnalist,infodict = get_ICE(sprunID,fasta_file)
-	argdict,vfdict,isdict,dfdict,metaldict,popdict,symdict = args(sprunID)
+	fasta_file = os.path.join(ws.tmp_dir, sprunID, sprunID+'.fa')
+	dictICE,ICEdict,table,infodict = get_ICE(sprunID,fasta_file)
+	argdict,vfdict,isdict,dfdict,metaldict,popdict,symdict = args(sprunID,dictICE,table)
 
 	ICEss = {}
 	for key,value in dictICE.items():
@@ -623,15 +714,14 @@ def get_map(sprunID,spdict,id_dict):
 		regijs = 'contig_'+sprunID.split("_contig_", 1)[-1] +'_'+key
 		genefile = os.path.join(final_dir,regi+'_gene.json')
 		infofile = os.path.join(final_dir,regi+'_info.json')
-		gcjson = os.path.join(js_dir,regijs+'_gc.js')
 		mapfile = os.path.join(js_dir,regijs+'.js')
 		htmlfile = os.path.join(final_dir,regi+'.html')
-		[myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend] = value
+		[myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,trnalist] = value
 
 		start = finalstart
 		while start < fICE:
-			gene = zill(header,start)
-			s,e,strand,pro = posdict[gene]
+			gene = table.gene(start)
+			s,e,strand,pro = table.pos(start)
 			pos = s+'..'+e+' ['+strand+'], '+str(int(e)-int(s)+1)
 
 			feature = 'Flank'
@@ -651,8 +741,8 @@ def get_map(sprunID,spdict,id_dict):
 
 		mov = fICE
 		while mov <= eICE:
-			gene = zill(header,mov)
-			s,e,strand,pro = posdict[gene]
+			gene = table.gene(mov)
+			s,e,strand,pro = table.pos(mov)
 			pos = s+'..'+e+' ['+strand+'], '+str(int(e)-int(s)+1)
 
 			if gene in ICEdict[key]:
@@ -679,8 +769,8 @@ def get_map(sprunID,spdict,id_dict):
 			genelist.append(content)				
 
 		while mov <= finalend:
-			gene = zill(header,mov)
-			s,e,strand,pro = posdict[gene]
+			gene = table.gene(mov)
+			s,e,strand,pro = table.pos(mov)
 			pos = s+'..'+e+' ['+strand+'], '+str(int(e)-int(s)+1)
 
 			feature = 'Flank'
@@ -703,16 +793,14 @@ def get_map(sprunID,spdict,id_dict):
 
 		contigID = sprunID.split('_', 1)[1]
 
-		sgene = zill(header,fICE)
-		egene = zill(header,eICE)
-		s1,e1,strand1,pro1 = posdict[sgene]
-		s2,e2,strand2,pro2 = posdict[egene]
+		s1,e1,strand1,pro1 = table.pos(fICE)
+		s2,e2,strand2,pro2 = table.pos(eICE)
 		if myDR1 == '0':
 			myDR1 = '1'
 
 		ICEss[regi] = '|'.join([myDR1,myDR4,str(fICE),str(eICE)])
 
-		host = spdict[contigID]
+		host = spdict.get(contigID,'-')
 		gcc = gc(fasta_file,int(myDR1),int(myDR4))
 		source = id_dict[contigID]
 
@@ -723,7 +811,7 @@ def get_map(sprunID,spdict,id_dict):
 		else:
 			DRw = '-'
 
-		oritseqs = oritseq(sprunID, regi, fasta_file, myDR1,myDR4)
+		oritseqs = '-'
 #		oritdesc = "<br>".join([oritseqs[i:i+63] for i in range(0, len(oritseqs), 63)])
 
 		ICEinfo = {
@@ -739,6 +827,8 @@ def get_map(sprunID,spdict,id_dict):
 		}
 		with open(infofile,'w') as info_file:
 			json.dump(ICEinfo, info_file, indent=4)
+		if headless:
+			continue
 
 		i = 1
 		mapzlist = []
@@ -768,34 +858,9 @@ def get_map(sprunID,spdict,id_dict):
 				mapflist.append(anno)
 			i += 1
 
-		head = 'var borders = [];\nvar tta_codons = [];\nvar orfs ='
 		s = genelist[0]['pos'].split(' ')[0].split('..')[0]
 		e = genelist[-1]['pos'].split(' ')[0].split('..')[1]
-
-		gcdict = calculate_gc(fasta_file, int(s), int(e), 500, 50)
-		with open(gcmap, 'r') as original_file:
-			original_content = original_file.read()
-		with open(gcjson,'w') as gein2:
-			gein2t = 'var jsonData = ' + str(gcdict)+';'
-			gein2.write(gein2t)
-			gein2.write(original_content) 
-
-#		with open(gcjson,'w') as gein2:
-#			json.dump(gcdict, gein2, indent=4)
-
-		maps = str(mapzlist)+';\nvar orfs2 ='+str(mapflist)+';\nvar clusterf2 = { start: '+s+', end: '+ \
-				  e+', idx: 1, orfs: orfs, borders: borders, tta_codons:tta_codons,\
-				  label: \'\', unordered: true };\nvar clusterr2 = { start: '+ s+', end: '+ \
-				  e+', idx: 2, orfs: orfs2, borders: borders, tta_codons:tta_codons,\
-				  label: \'\', unordered: true };\nsvgene.drawClusters("'+regijs+'", [clusterf2, clusterr2], 50, 920);'
-		with open(mapfile,'w') as map_file:
-			map_file.write(head + maps)
-
-		with open(viewfile, 'r') as file:
-			file_content = file.read()
-		new_content = file_content.replace('XXXX', regijs)
-		with open(htmlfile, 'w') as file:
-			file.write(new_content)
+		render_ice(regijs, mapfile, htmlfile, fasta_file, s, e, mapzlist, mapflist)
 
 	return ICEss
 
@@ -813,29 +878,17 @@ def copy_files(source_dir, destination_dir):
             else:
                 shutil.copy2(source_item, destination_item)
 
-def delete_folders_starting_with_keyword(dir, keyword):
-	for dirpath, dirnames, filenames in os.walk(dir, topdown=False):
-		for dirname in dirnames:
-			if dirname.startswith(keyword):
-				folder_to_remove = os.path.join(dirpath, dirname)
-				shutil.rmtree(folder_to_remove)
-
 def getfasta(runID,resultdir,id_dict,key,s,e,stag,etag):
 
-	fafile = os.path.join(tmp_dir, runID, runID+'.fa')	
-	faafile = os.path.join(tmp_dir, 'gbk', runID+'.faa')
+	fafile = os.path.join(ws.tmp_dir, runID, runID+'.fa')	
+	faafile = os.path.join(ws.gb_dir, runID+'.faa')
 
 	outfa = os.path.join(resultdir,key+'.fa')
 	outfaa = os.path.join(resultdir,key+'.faa')
 
-	seq_record = SeqIO.read(fafile, "fasta")
-	with open(outfa, "w") as output_handle1:
-		sequence = seq_record.seq[int(s)-1:int(e)]
-		ID = '_'.join(seq_record.id.split('_')[-2:])
-		seq_record.description = ''
-		seq_record.seq = sequence
-		seq_record.id = id_dict[ID] + ' ' + s +'-'+e
-		SeqIO.write(seq_record, output_handle1, "fasta")
+	genome = load_genome(fafile)
+	ID = '_'.join(genome.id.split('_')[-2:])
+	genome.write_region(outfa, s, e, id_dict[ID] + ' ' + s +'-'+e)
 
 	faa_records = SeqIO.parse(faafile, "fasta")
 	with open(outfaa, "w") as output_handle2:
@@ -844,66 +897,110 @@ def getfasta(runID,resultdir,id_dict,key,s,e,stag,etag):
 			if int(stag) <= seq_id <= int(etag):
 				SeqIO.write(faa_record, output_handle2, "fasta")
 
-def _meta(runID,infile):
+def run_contig(runID,contigID,seqfa,spdict,id_dict,annotate=True):
+
+	sprunID = runID + '_' + contigID
+	newfolder = os.path.join(ws.tmp_dir, sprunID)
+	if not os.path.exists(newfolder):
+		os.makedirs(newfolder)
+	spfa = os.path.join(newfolder, sprunID+'.fa')
+	with open(spfa,'w') as outfa:
+		outfa.write(">%s\n%s\n" % (sprunID,seqfa))
+
+	final_dir = os.path.join(ws.tmp_dir,sprunID,'result')
+	if not os.path.exists(final_dir):
+		os.makedirs(final_dir)
+
+	if annotate:
+		prokkanno(sprunID,spfa)
+	ICEss = get_map(sprunID,spdict,id_dict)
+
+	return ICEss
+
+def _meta(runID,infile,workers=1):
 
 	resultdir = os.path.join(workdir, 'result', runID)
 	if not os.path.exists(resultdir):
-		os.system('mkdir '+resultdir)
-	jsback = os.path.join(workdir,'script','js')
+		os.makedirs(resultdir)
 
-	id_dict = rename(runID,infile)
+	id_dict,full_dict = rename(runID,infile)
 	chosenfa = prescan(runID)
-	drawout,spdict,report = Taxonomy(runID)
-#	spdict = {}
+	taxmode = get_option('taxonomy','full')
+	taxfile = get_option('taxfile','')
+	if taxfile:
+		spdict = user_taxa(taxfile,full_dict)
+	elif taxmode == 'full':
+		drawout,spdict,report = Taxonomy(runID)
+		copy_files(report, resultdir)
+	else:
+		spdict = {}
 	basefile = getbase(runID)
 #	copy_files(drawout, resultdir)
 	copy_files(basefile, resultdir)
-	copy_files(report, resultdir)
 
-	ICEsum = os.path.join(tmp_dir,runID, runID+'_ICEsum.json')
-	newIDfa = os.path.join(tmp_dir, runID, runID+'_newID.fa')
-	i = 1 
-	ICEsumlist = []
+	ICEsum = os.path.join(ws.tmp_dir,runID, runID+'_ICEsum.json')
+	newIDfa = os.path.join(ws.tmp_dir, runID, runID+'_newID.fa')
+
+	contigs = []
 	for seq_record in SeqIO.parse(newIDfa, "fasta"):
 		if seq_record.id in chosenfa:
-			sprunID = runID + '_' + seq_record.id
-			seqfa = str(seq_record.seq)
-			newfolder = os.path.join(tmp_dir, sprunID)			
-			if not os.path.exists(newfolder):
-				os.makedirs(newfolder)
-			spfa = os.path.join(newfolder, sprunID+'.fa')
-			with open(spfa,'w') as outfa:
-				outfa.write(">%s\n%s\n" % (sprunID,seqfa))
-
-			final_dir = os.path.join(tmp_dir,sprunID,'result')
-			if not os.path.exists(final_dir):
-				os.makedirs(final_dir)
-
-			prokkanno(sprunID,spfa)
-			ICEss = get_map(sprunID,spdict,id_dict)
-			copy_files(final_dir, resultdir)
-
-			if ICEss:
-				for key,value in ICEss.items():
-					[s,e,stag,etag] = value.split('|')
-					lengt = int(e) - int(s) + 1
-					ICEs = {
-						'id' : str(i),
-				        'seqid': id_dict[seq_record.id],
-				        'species':spdict[seq_record.id],
-#						'species':'',
-				        'location': s+'..'+e,
-				        'length': lengt,
-				        'detail': key
-				    }
-					ICEsumlist.append(ICEs)
-					getfasta(sprunID,resultdir,id_dict,key,s,e,stag,etag)
-					i += 1 
+			contigs.append([seq_record.id,str(seq_record.seq)])
+
+	metaanno = get_option('metaanno','prokka')
+	if metaanno == 'pooled' and contigs:
+		poolanno(runID,contigs)
+	elif metaanno == 'prodigal' and contigs:
+		prodanno(runID,contigs)
+	annotate = metaanno == 'prokka'
+
+	ICEres = {}
+	if workers > 1:
+		bylen = sorted(contigs, key=lambda x: len(x[1]), reverse=True)
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			futures = {pool.submit(run_contig,runID,contigID,seqfa,spdict,id_dict,annotate):contigID for contigID,seqfa in bylen}
+			for future in as_completed(futures):
+				ICEres[futures[future]] = future.result()
+	else:
+		for contigID,seqfa in contigs:
+			ICEres[contigID] = run_contig(runID,contigID,seqfa,spdict,id_dict,annotate)
+
+	orit(runID,contigs,ICEres)
+
+	if taxmode == 'lazy' and not taxfile:
+		icecontigs = [[contigID,seqfa] for contigID,seqfa in contigs if ICEres[contigID]]
+		if icecontigs:
+			drawout,spdict,report = Taxonomy(runID,icecontigs)
+			copy_files(report, resultdir)
+			for contigID,seqfa in icecontigs:
+				set_info(runID+'_'+contigID,dict((regi,{'Host Strain':spdict.get(contigID,'-')}) for regi in ICEres[contigID]))
+
+	i = 1 
+	ICEsumlist = []
+	for contigID,seqfa in contigs:
+		sprunID = runID + '_' + contigID
+		final_dir = os.path.join(ws.tmp_dir,sprunID,'result')
+		copy_files(final_dir, resultdir)
+
+		ICEss = ICEres[contigID]
+		if ICEss:
+			for key,value in ICEss.items():
+				[s,e,stag,etag] = value.split('|')
+				lengt = int(e) - int(s) + 1
+				ICEs = {
+					'id' : str(i),
+			        'seqid': id_dict[contigID],
+			        'species':spdict.get(contigID,'-'),
+#					'species':'',
+			        'location': s+'..'+e,
+			        'length': lengt,
+			        'detail': key
+			    }
+				ICEsumlist.append(ICEs)
+				getfasta(sprunID,resultdir,id_dict,key,s,e,stag,etag)
+				i += 1 
 
 	with open(ICEsum,'w') as ice_file:
 		json.dump(ICEsumlist, ice_file, indent=4)
 
 	copy_files(ICEsum, resultdir)
-	jsdir = os.path.join(resultdir,'js')
-	copy_files(jsback, jsdir)
-	delete_folders_starting_with_keyword(tmp_dir, runID)
+	ws.close_run()
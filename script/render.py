@@ -0,0 +1,98 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,json,shutil,hashlib,threading,uuid
+from script.config import get_param, get_option
+from script.genome import load_genome
+
+param = get_param()
+workdir = param[0]
+jsback = os.path.join(workdir,'script','js')
+assetfiles = ['highcharts.js','data.js','d3.css','d3.v2.js','svgene.js','jquery-3.6.0.min.js','icemap.js','gcmap.js']
+maxpoints = 2000
+
+lock = threading.Lock()
+templates = {}
+bundles = {}
+
+def get_template(name):
+
+	with lock:
+		if name not in templates:
+			with open(os.path.join(jsback,name),'r') as tin:
+				templates[name] = tin.read()
+		return templates[name]
+
+def get_version():
+
+	with lock:
+		if 'version' not in bundles:
+			sha = hashlib.sha256()
+			for name in assetfiles:
+				with open(os.path.join(jsback,name),'rb') as fin:
+					sha.update(fin.read())
+			bundles['version'] = sha.hexdigest()[:12]
+		return bundles['version']
+
+def get_assets():
+
+	prefix = get_option('assets','')
+	if prefix:
+		return prefix.rstrip('/')
+
+	version = get_version()
+	bundle = os.path.join(workdir,'result','assets',version)
+	if not os.path.isdir(bundle):
+		tmpdir = bundle+'.'+uuid.uuid4().hex
+		os.makedirs(tmpdir)
+		for name in assetfiles:
+			shutil.copy(os.path.join(jsback,name), tmpdir)
+		try:
+			os.rename(tmpdir, bundle)
+		except OSError:
+			shutil.rmtree(tmpdir, ignore_errors=True)
+	return '../assets/'+version
+
+def gc_step(start, end, window_size=500, step_size=50):
+
+	lengt = end - start + 1
+	while lengt // step_size > maxpoints:
+		step_size *= 2
+	return max(window_size, step_size),step_size
+
+def calculate_gc(fasta_file, start, end):
+
+	if start == 0:
+		start = 1
+	window_size,step_size = gc_step(start, end)
+	pos,gc_contents = load_genome(fasta_file).gc_windows(start, end, window_size, step_size)
+
+	gcdict = {
+		        'xData':pos,
+		        'datasets':[{
+		            'name':'',
+		            'data':[round(x, 2) for x in gc_contents],
+		            'unit':'%',
+		            'type':'line',
+		            "valueDecimals": 1
+		        }]
+	    }
+
+	return gcdict
+
+def render_ice(regijs, mapfile, htmlfile, fasta_file, s, e, mapzlist, mapflist):
+
+	icedata = {
+		'id':regijs,
+		'start':int(s),
+		'end':int(e),
+		'orfs':mapzlist,
+		'orfs2':mapflist,
+		'gc':calculate_gc(fasta_file, int(s), int(e))
+	}
+	with open(mapfile,'w') as map_file:
+		map_file.write('var iceData = ' + json.dumps(icedata, separators=(',',':')) + ';\n')
+
+	html = get_template('view.html').replace('ASSETS', get_assets()).replace('XXXX', regijs)
+	with open(htmlfile,'w') as html_file:
+		html_file.write(html)
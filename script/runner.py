@@ -0,0 +1,63 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,subprocess,threading
+from collections import deque
+
+lock = threading.Lock()
+procs = set()
+maxerr = 50
+
+def drain(pipe, errlines):
+
+	for line in iter(pipe.readline, ''):
+		errlines.append(line.rstrip('\n'))
+	pipe.close()
+
+def start(cmd, stdout):
+
+	proc = subprocess.Popen([str(x) for x in cmd], stdin=subprocess.DEVNULL, stdout=stdout,
+				stderr=subprocess.PIPE, universal_newlines=True, bufsize=1 << 16)
+	errlines = deque(maxlen=maxerr)
+	reader = threading.Thread(target=drain, args=(proc.stderr, errlines), daemon=True)
+	reader.start()
+	with lock:
+		procs.add(proc)
+	return proc,reader,errlines
+
+def finish(cmd, proc, reader, errlines, check=True):
+
+	code = proc.wait()
+	reader.join()
+	with lock:
+		procs.discard(proc)
+	if code and check:
+		raise RuntimeError('%s exited with code %d\n%s' % (os.path.basename(str(cmd[0])), code, '\n'.join('  '+line for line in errlines)))
+	return code,'\n'.join(errlines)
+
+def run(cmd):
+
+	proc,reader,errlines = start(cmd, subprocess.DEVNULL)
+	return finish(cmd, proc, reader, errlines)
+
+def stream(cmd):
+
+	proc,reader,errlines = start(cmd, subprocess.PIPE)
+	done = False
+	try:
+		for line in proc.stdout:
+			yield line
+		done = True
+	finally:
+		proc.stdout.close()
+		if not done and proc.poll() is None:
+			proc.terminate()
+		finish(cmd, proc, reader, errlines, done)
+
+def cancel():
+
+	with lock:
+		running = list(procs)
+	for proc in running:
+		if proc.poll() is None:
+			proc.terminate()
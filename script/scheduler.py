@@ -0,0 +1,57 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,threading
+from contextlib import contextmanager
+from script.config import get_resource
+
+cond = threading.Condition()
+budget = {'cores':0, 'memory':0, 'freecores':0, 'freemem':0}
+
+def set_budget(cores=0,memory=0):
+
+	if not cores:
+		cores = os.cpu_count() or 1
+	with cond:
+		budget['cores'] = budget['freecores'] = int(cores)
+		budget['memory'] = budget['freemem'] = float(memory)
+		cond.notify_all()
+
+def get_budget():
+
+	if not budget['cores']:
+		set_budget(*get_resource())
+	return budget['cores'],budget['memory']
+
+def split_budget(n):
+
+	cores,memory = get_budget()
+	return max(1, cores // n),memory / n
+
+@contextmanager
+def lease(cores,memory=0):
+
+	total,totalmem = get_budget()
+	ncore = max(1, min(int(cores), total))
+	nmem = min(float(memory), totalmem) if totalmem else 0
+	with cond:
+		while budget['freecores'] < ncore or budget['freemem'] < nmem:
+			cond.wait()
+		budget['freecores'] -= ncore
+		budget['freemem'] -= nmem
+	try:
+		yield ncore
+	finally:
+		with cond:
+			budget['freecores'] += ncore
+			budget['freemem'] += nmem
+			cond.notify_all()
+
+def db_memory(db_dir):
+
+	size = 0
+	if os.path.isdir(db_dir):
+		for filename in os.listdir(db_dir):
+			if filename.endswith('.k2d'):
+				size += os.path.getsize(os.path.join(db_dir,filename))
+	return size / 1024**3
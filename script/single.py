@@ -5,11 +5,19 @@ import os,time
 import random,json
 import string,shutil
 from Bio import SeqIO
-from Bio.SeqUtils import GC
 from Bio.SeqFeature import CompoundLocation, FeatureLocation
 from functools import cmp_to_key
-from script.function import getblast
-from script.config import get_param
+from script.function import getblast, region_genes, readblast, oritsearch, readorit
+from script.config import get_param, get_option
+from script.genome import load_genome
+from script.genetable import GeneTable
+from script.drsearch import local_DR, vmatch_DR
+from script.cache import make_key, file_hash, fasta_hash, stamp, fetch, clear, store, relabel_gff
+from script.scheduler import lease
+from script.runner import run
+from script.checkpoint import is_done, mark_done, get_stage
+from script.render import render_ice
+from script import workspace as ws
 
 param = get_param()
 workdir = param[0]
@@ -18,10 +26,6 @@ prokka = param[8]
 macsyfinder = param[9]
 hmmsearch = param[10]
 
-tmp_dir = os.path.join(workdir,'tmp') 
-in_dir = os.path.join(tmp_dir,'fasta')
-gb_dir = os.path.join(tmp_dir,'gbk')
-
 
 def get_time():
 
@@ -29,141 +33,122 @@ def get_time():
 
 def gc(fasta_file,start,end):
 
-	record = SeqIO.read(fasta_file, "fasta")
-	sequence = record.seq[start-1:end]
-	gcs = str("%.2f"%GC(sequence))
-
-	return gcs
-
-def calculate_gc(fasta_file, start, end, window_size, step_size):
-
-	record = SeqIO.read(fasta_file, "fasta")
-	if start == 0:
-		start = 1
-	sequence = record.seq[start-1:end]
-
-	windows = []
-	gc_contents = []
-	pos = []
-	j = start/1000 + 0.025
-	for i in range(0, len(sequence) - window_size + 1, step_size):
-		window = sequence[i:i+window_size]
-		gc_content = GC(window)
-		gc_contents.append(gc_content)
-		pos.append(round(j, 4))
-		j += 0.05
-
-	gcdict = {
-		        'xData':pos,
-		        'datasets':[{
-		            'name':'',
-		            'data':gc_contents,
-		            'unit':'%',
-		            'type':'line',
-		            "valueDecimals": 1
-		        }]
-	    }
-
-	return gcdict
+	return load_genome(fasta_file).gc(start,end)
 
 def prokkanno(runID,infile):
 
-	cmd = [prokka,infile,"--force","--fast --quiet --cdsrnaolap --cpus 8 ","--outdir",gb_dir,"--prefix",runID]
-	os.system(' '.join(cmd))
+	annofiles = dict((ext,os.path.join(ws.gb_dir, runID + '.' + ext)) for ext in ['gff','faa','ffn'])
+	key = make_key(fasta_hash(infile), stamp(prokka), 'fast cdsrnaolap')
+	if fetch('prokka',key,annofiles):
+		relabel_gff(annofiles['gff'],runID)
+		return
+
+	clear(annofiles)
+	with lease(8) as ncpu:
+		cmd = [prokka,infile,"--force","--fast","--quiet","--cdsrnaolap","--cpus",ncpu,"--outdir",ws.gb_dir,"--prefix",runID]
+		run(cmd)
+	store('prokka',key,annofiles)
 
 def ICEscan(runID):
 
-	anno_fa = os.path.join(gb_dir, runID + '.faa')
-	ICE_res = os.path.join(tmp_dir, runID, runID + '_ICE')
-	ICE_cmd = macsyfinder + ' --db-type ordered_replicon --hmmer '+ hmmsearch + ' --models-dir ./data/macsydata/ --models ICEscan all --replicon-topology linear --coverage-profile 0.3 --sequence-db '+ anno_fa+ ' -o ' + ICE_res + ' > /dev/null'
-	os.system(ICE_cmd)
+	anno_fa = os.path.join(ws.gb_dir, runID + '.faa')
+	ICE_res = os.path.join(ws.tmp_dir, runID, runID + '_ICE')
+	sysfiles = {'all_systems.tsv':os.path.join(ICE_res,'all_systems.tsv')}
+	key = make_key(file_hash(anno_fa), stamp(macsyfinder,hmmsearch,'./data/macsydata'), 'ICEscan all linear 0.3')
+	if fetch('ICEscan',key,sysfiles):
+		return
+
+	clear(sysfiles)
+	with lease(8) as ncpu:
+		ICE_cmd = [macsyfinder,'--db-type','ordered_replicon','--hmmer',hmmsearch,'-w',ncpu,'--models-dir','./data/macsydata/',
+			   '--models','ICEscan','all','--replicon-topology','linear','--coverage-profile','0.3','--sequence-db',anno_fa,'-o',ICE_res]
+		run(ICE_cmd)
+	store('ICEscan',key,sysfiles)
 
 def getgff1(runID):
 
-	gffile = os.path.join(gb_dir, runID + '.gff')
-	locusdict = {}
+	gffile = os.path.join(ws.gb_dir, runID + '.gff')
+	table = None
 	with open(gffile,'r') as gffin:
-		trnadict = {}
-		posdict = {}
 		for line in gffin.readlines():
 			if 'ID=' in line:
 				lines = line.strip().split('\t')
 				ids = lines[8].split(';')[0].split('=')[1]
-				locusdict[ids] = ids		
-				header = ids.split('_')[0]
+				if table is None:
+					table = GeneTable(ids.split('_')[0])
 				product = lines[8].split('product=')[1]
-				pos = [lines[3],lines[4],lines[6],product]
-				if lines[2] == 'tRNA' or lines[2] == 'tmRNA':
-					trnadict[ids] = pos
-				posdict[ids] = pos
-				totalnum = getnum(ids)
+				istrna = lines[2] == 'tRNA' or lines[2] == 'tmRNA'
+				table.add(getnum(ids),ids,lines[3],lines[4],lines[6],product,trna=istrna)
 
-	return trnadict,posdict,header,totalnum,locusdict
+	return table
 
 def getgff(runID):
 
-	gbfile = os.path.join(gb_dir, runID + '.gbk')
-	faafile = os.path.join(gb_dir, runID + '.faa')
-	ffnfile = os.path.join(gb_dir, runID + '.ffn')
-	records = SeqIO.parse(gbfile, "genbank")
-	locusdict = {}
-	trnadict = {}
-	posdict = {}
+	gbfile = os.path.join(ws.gb_dir, runID + '.gbk')
+	faafile = os.path.join(ws.gb_dir, runID + '.faa')
+	ffnfile = os.path.join(ws.gb_dir, runID + '.ffn')
+	genome = load_genome(os.path.join(ws.in_dir, runID + '.fa'))
+	features = genome.features
+	if features is None:
+		features = SeqIO.read(gbfile, "genbank").features
+	table = GeneTable('TMPID')
 
 	with open(faafile, "w") as output_handle1, open(ffnfile, "w") as output_handle2:
-		for record in records:
-			i = 1			
-			for feature in record.features:
-				if feature.type == 'CDS' or feature.type == 'rRNA':
-					if 'locus_tag' in feature.qualifiers:
-						id = feature.qualifiers['locus_tag'][0]
-				
-						if isinstance(feature.location, CompoundLocation):
-							last_part = min(feature.location.parts, key=lambda part: part.start.position)
-						else:
-							last_part = feature.location
-						s = str(int(last_part.start))
-						e = str(int(last_part.end))
-						zf = gstrand1(last_part.strand)
+		i = 1			
+		for feature in features:
+			if feature.type == 'CDS' or feature.type == 'rRNA':
+				if 'locus_tag' in feature.qualifiers:
+					id = feature.qualifiers['locus_tag'][0]
+			
+					if isinstance(feature.location, CompoundLocation):
+						last_part = min(feature.location.parts, key=lambda part: part.start.position)
+					else:
+						last_part = feature.location
+					s = str(int(last_part.start))
+					e = str(int(last_part.end))
+					zf = gstrand1(last_part.strand)
 
-						if 'product' in feature.qualifiers:
-							pro = feature.qualifiers['product'][0]
-						else:
-							pro = '-'
-						newid = zill('TMPID',i)
-						locusdict[newid] = id
-						posdict[newid] = [s,e,zf,pro]
-						if "translation" in feature.qualifiers:
-							aa_sequence = feature.qualifiers["translation"][0]
-							output_handle1.write(f">{newid} {pro}\n")
-							output_handle1.write(f"{aa_sequence}\n")				
-							cds_sequence = record.seq[feature.location.start:feature.location.end]
-							output_handle2.write(f">{newid} {pro}\n")
-							output_handle2.write(f"{cds_sequence}\n")
-						i += 1
-				if feature.type == 'tRNA' or feature.type == 'tmRNA':
-					if 'locus_tag' in feature.qualifiers:
-						id = feature.qualifiers['locus_tag'][0]
-						s = str(int(feature.location.start))
-						e = str(int(feature.location.end))
-						zf = gstrand1(feature.location.strand)
-						if feature.type != 'tmRNA':
-							pro = feature.qualifiers['product'][0]
-						else:
-							pro = 'tmRNA'
-						newid = zill('TMPID',i)
-						locusdict[newid] = id
-						posdict[newid] = [s,e,zf,pro]
-						trnadict[newid] = [s,e,zf,pro]
-						i += 1
+					if 'product' in feature.qualifiers:
+						pro = feature.qualifiers['product'][0]
+					else:
+						pro = '-'
+					newid = zill('TMPID',i)
+					table.add(i,newid,s,e,zf,pro,locus=id)
+					if "translation" in feature.qualifiers:
+						aa_sequence = feature.qualifiers["translation"][0]
+						output_handle1.write(f">{newid} {pro}\n")
+						output_handle1.write(f"{aa_sequence}\n")				
+						cds_sequence = genome.seq[int(feature.location.start):int(feature.location.end)]
+						output_handle2.write(f">{newid} {pro}\n")
+						output_handle2.write(f"{cds_sequence}\n")
+					i += 1
+			if feature.type == 'tRNA' or feature.type == 'tmRNA':
+				if 'locus_tag' in feature.qualifiers:
+					id = feature.qualifiers['locus_tag'][0]
+					s = str(int(feature.location.start))
+					e = str(int(feature.location.end))
+					zf = gstrand1(feature.location.strand)
+					if feature.type != 'tmRNA':
+						pro = feature.qualifiers['product'][0]
+					else:
+						pro = 'tmRNA'
+					newid = zill('TMPID',i)
+					table.add(i,newid,s,e,zf,pro,locus=id,trna=True)
+					i += 1
 	
-	return trnadict,posdict,'TMPID',(i-1),locusdict
+	return table
 
 				
 def getnum(ID):
 
 	return int(ID.split('_')[1].lstrip("0"))
 
+def homology_genes(dictICE,table):
+
+	if get_option('homology','genome') == 'region':
+		return region_genes(dictICE,table)
+	return None
+
 def zill(header,num):
 
 	return header+ '_' +str(num).zfill(5)
@@ -183,29 +168,27 @@ def find_max_distance(numbers):
 
 	return numbers[max_distance_index], numbers[max_distance_index + 1]
 
-def pos_tag(pos,posdict,ICE,final,totalnum,dirtag):
+def pos_tag(pos,table,ICE,final,dirtag):
 
 	tICE = ICE
 	tfinal = final
-	for k,v in posdict.items():
-		vstart,vend = int(v[0]),int(v[1])
-		if int(pos) <= vend:
-			if dirtag == 's':
-				tICE = getnum(k)
-				tfinal = max(1, tICE - 5)
+	hit = table.locate(pos)
+	if hit:
+		num,vstart = hit
+		if dirtag == 's':
+			tICE = num
+			tfinal = max(1, tICE - 5)
+		else:
+			if vstart > pos:
+				tICE = num - 1 
 			else:
-				if vstart > int(pos):
-					tICE = getnum(k) - 1 
-				else:
-					tICE = getnum(k)
-				tfinal = min(totalnum, tICE + 5)
-			break
+				tICE = num
+			tfinal = min(table.totalnum, tICE + 5)
 	return tICE, tfinal
 
-def merge_tRNA(runID,ICEdict,DRlist,listgff):
-
-	[trnadict,posdict,header,totalnum,locusdict] = listgff
+def merge_tRNA(runID,ICEdict,DRlist,table,infile):
 
+	totalnum = table.totalnum
 	fICE = getnum(next(iter(ICEdict)))
 	eICE = getnum(list(ICEdict.keys())[-1])
 	nfICEnum = max(1, fICE - 5)
@@ -213,115 +196,78 @@ def merge_tRNA(runID,ICEdict,DRlist,listgff):
 
 	ICEtagnum = [nfICEnum,neICEnum]
 	trnalist = []
-	for key,value in trnadict.items():
-		if nfICEnum <= getnum(key) <= neICEnum:
-			ICEtagnum.append(getnum(key))
-			trnalist.append(value)
+	for num in table.trna_nums(nfICEnum,neICEnum):
+		ICEtagnum.append(num)
+		trnalist.append(table.pos(num))
 
 	ICEtagnum.sort()
 	finalstart,finalend = find_max_distance(ICEtagnum)
 
-	myDR1 = posdict[zill(header,fICE)][0]
+	myDR1 = str(table.start(fICE))
 	myDR2 = ''
 	myDR3 = ''
-	myDR4 = posdict[zill(header,eICE)][1]
+	myDR4 = str(table.end(eICE))
 
 	if trnalist:
 		if finalend == neICEnum:
 			fICE = finalstart
 			finalstart =  max(1, finalstart - 5)
-			myDR1 = posdict[zill(header,fICE)][0]
-			for line in DRlist:
-				DRs = line.split('|')
-				if int(DRs[3]) - int(DRs[0]) > 500000:
+			myDR1 = str(table.start(fICE))
+			if DRlist is None:
+				DRlist = local_DR(infile,table.start(fICE),table.end(fICE),'s',1)
+			for DRs in DRlist:
+				if DRs[3] - DRs[0] > 500000:
 					continue				
-				if int(DRs[3]) - int(DRs[0]) < 5000:
+				if DRs[3] - DRs[0] < 5000:
 					continue	
-				if int(posdict[zill(header,fICE)][0]) < int(DRs[0]) < int(posdict[zill(header,fICE)][1]):
-					checktrna = 0
-					for key,value in trnadict.items():
-						if int(DRs[0]) <= int(value[0]) <= int(DRs[3]) and int(DRs[0]) <= int(value[1]) <= int(DRs[3]):
-							checktrna += 1
-					if checktrna >= 2:
+				if table.start(fICE) < DRs[0] < table.end(fICE):
+					if table.count_trna(DRs[0],DRs[3]) >= 2:
 						break
 
-					eICE,finalend = pos_tag(DRs[3],posdict,eICE,finalend,totalnum,'e')
-					myDR1 = DRs[0]
-					myDR2 = DRs[1]
-					myDR3 = DRs[2]
-					myDR4 = DRs[3]									
+					eICE,finalend = pos_tag(DRs[3],table,eICE,finalend,'e')
+					myDR1,myDR2,myDR3,myDR4 = [str(x) for x in DRs]
 					break
 
 		elif finalstart == nfICEnum:
 			eICE = finalend
 			finalend = min(totalnum, finalend + 5)
-			myDR4 = posdict[zill(header,eICE)][1]					
-			for line in DRlist:
-				DRs = line.split('|')
-				if int(DRs[3]) - int(DRs[0]) > 500000:
+			myDR4 = str(table.end(eICE))
+			if DRlist is None:
+				DRlist = local_DR(infile,table.start(eICE),table.end(eICE),'e',1)
+			for DRs in DRlist:
+				if DRs[3] - DRs[0] > 500000:
 					continue
-				if int(DRs[3]) - int(DRs[0]) < 5000:
+				if DRs[3] - DRs[0] < 5000:
 					continue
-				if int(posdict[zill(header,eICE)][0]) < int(DRs[3]) < int(posdict[zill(header,eICE)][1]):
-					checktrna = 0
-					for key,value in trnadict.items():
-						if int(DRs[0]) <= int(value[0]) <= int(DRs[3]) and int(DRs[0]) <= int(value[1]) <= int(DRs[3]):
-							checktrna += 1
-					if checktrna >= 2:
+				if table.start(eICE) < DRs[3] < table.end(eICE):
+					if table.count_trna(DRs[0],DRs[3]) >= 2:
 						break
 
-					fICE,finalstart = pos_tag(DRs[0],posdict,fICE,finalstart,totalnum,'s')
-					myDR1 = DRs[0]
-					myDR2 = DRs[1]
-					myDR3 = DRs[2]
-					myDR4 = DRs[3]
+					fICE,finalstart = pos_tag(DRs[0],table,fICE,finalstart,'s')
+					myDR1,myDR2,myDR3,myDR4 = [str(x) for x in DRs]
 					break
-	return myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,posdict,header,trnalist,locusdict
+	return myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,trnalist
 
 def get_DR(runID,infile):
 
-	DRindex = os.path.join(tmp_dir, runID, runID+'_DR')
-	DRout = os.path.join(tmp_dir, runID, runID+'_DRout')
-	maktree_cmd = './tool/mkvtree -db ' + infile +' -indexname '+ DRindex +' -dna -pl -lcp -suf -tis -ois -bwt -bck -sti1'
-	vmatch_cmd = './tool/vmatch -l 15 '+ DRindex + ' > '+ DRout
-	os.system(maktree_cmd)
-	os.system(vmatch_cmd)
-
-	DRlist = []
-	with open(DRout,'r') as DRin:
-		for line in DRin.readlines():
-			lines = line.strip().split()
-			if not line.startswith('#'):
-				DR = [str(int(lines[2])+1),str(int(lines[2])+int(lines[0])),str(int(lines[6])+1),str(int(lines[6])+int(lines[4]))]
-				DRlist.append('|'.join(DR))
-	return DRlist
-
-def oritseq(runID, regi, infile, start, end):
-
-	oritseq = '-'
-	fafile = os.path.join(tmp_dir,runID,regi+'_fororit.fa')	
-	with open(fafile,'w') as orif:
-		seq = getfa(infile,start,end)
-		orif.write('>fororit\n')
-		orif.write(seq)
-
-	oriT_Database = os.path.join(workdir,'data','oriT_db')
-	blastn_out = os.path.join(tmp_dir,runID,regi+'_oriTout')
-	blast_cmd = [blastn, "-db", oriT_Database, "-query", fafile, "-evalue 0.01 -word_size 11 -outfmt '6 std qlen slen' -num_alignments 1 -out", blastn_out,">/dev/null"]
-	os.system(' '.join(blast_cmd))
-
-	with open(blastn_out,'r') as oritout:
-		for line in oritout.readlines():
-			lines = line.strip().split()
-			if lines[0]:
-				matchl = int(lines[3])
-				slen = int(lines[13])
-				ident = float(lines[2])
-				hvalue = (matchl/slen)*ident	
-				if hvalue > 0.49:
-					oritseq = getfa(fafile,str(int(lines[6])-1),lines[7])
-					break
-	return oritseq
+	DRindex = os.path.join(ws.tmp_dir, runID, runID+'_DR')
+	DRout = os.path.join(ws.tmp_dir, runID, runID+'_DRout')
+	return vmatch_DR(infile,DRindex,DRout,1)
+
+def orit(runID,infile,dictICE):
+
+	regions = []
+	for key,value in dictICE.items():
+		myDR1,myDR4 = value[0],value[3]
+		if myDR1 == '0':
+			myDR1 = '1'
+		regions.append([runID+'_'+key,getfa(infile,myDR1,myDR4)])
+
+	if is_done(runID,'oriT'):
+		return readorit(runID,regions)
+	oritdict = oritsearch(runID,regions)
+	mark_done(runID,'oriT')
+	return oritdict
 
 def ICE_filter(ICE_res):
 
@@ -385,14 +331,22 @@ def ICE_filter(ICE_res):
 
 	return fICE+fIME+fAICE
 
-def get_ICE(runID,infile,listgff):
+def get_ICE(runID,infile,table):
 
-	ICE_dir = os.path.join(tmp_dir, runID, runID + '_ICE')
+	ICE_dir = os.path.join(ws.tmp_dir, runID, runID + '_ICE')
 	ICE_res = os.path.join(ICE_dir,'all_systems.tsv')
-
-	if os.path.exists(ICE_dir):
-		os.system('rm -r ' + ICE_dir)
-	ICEscan(runID)
+	ICEjson = os.path.join(ws.tmp_dir, runID, runID + '_ICE.json')
+
+	if is_done(runID,'DR'):
+		with open(ICEjson,'r') as ICEin:
+			dictICE,ICEdict,infodict = json.load(ICEin)
+		return dictICE,ICEdict,infodict
+
+	if not is_done(runID,'ICEscan'):
+		if os.path.exists(ICE_dir):
+			shutil.rmtree(ICE_dir)
+		ICEscan(runID)
+		mark_done(runID,'ICEscan',outputs=[ICE_res])
 	ftag = ICE_filter(ICE_res)
 
 	with open(ICE_res,'r') as ICEin:
@@ -437,20 +391,27 @@ def get_ICE(runID,infile,listgff):
 						infodict[ICEtag]['mpf'].append(mpf)				
 
 	dictICE = {}
-	posdict = {}
-	trnalist = []
-	header = ''
-	DRlist = get_DR(runID,infile)
+	if get_option('drsearch','local') == 'vmatch':
+		DRlist = get_DR(runID,infile)
+	else:
+		DRlist = None
 
 	for key,value in ICEdict.items():
-		myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,posdict,header,trnalist,locusdict = merge_tRNA(runID,value,DRlist,listgff)
-		dictICE[key] = [myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,trnalist,locusdict]
+		dictICE[key] = list(merge_tRNA(runID,value,DRlist,table,infile))
 
-	return dictICE,ICEdict,posdict,header,infodict					
+	with open(ICEjson,'w') as ICEout:
+		json.dump([dictICE,ICEdict,infodict], ICEout)
+	mark_done(runID,'DR')
 
-def args(runID):
+	return dictICE,ICEdict,infodict					
 
-	return getblast(runID)
+def args(runID,dictICE,table):
+
+	if is_done(runID,'homology'):
+		return readblast(runID)
+	blastres = getblast(runID,genes=homology_genes(dictICE,table))
+	mark_done(runID,'homology')
+	return blastres
 
 def get_args(argdict,vfdict,isdict,dfdict,metaldict,popdict,symdict,gene,feature,product):
 
@@ -587,19 +548,17 @@ def gstrand1(instra):
 
 def getfa(infile,s,e):
 
-	seq_record = SeqIO.read(infile, "fasta")
-	sequence = seq_record.seq[int(s):int(e)]
-	return str(sequence)
+	return load_genome(infile).getfa(s,e)
 
-def get_map(runID,infile,listgff):
+def get_map(runID,infile,table):
 
 	final_dir = os.path.join(workdir,'result',runID)
 	js_dir = os.path.join(workdir,'result',runID,'js')
-	gcmap = os.path.join(workdir,'script','js','gcmap.js')
-	viewfile = os.path.join(workdir,'script','js','view.html')
-	dictICE,ICEdict,posdict,header,infodict = get_ICE(runID,infile,listgff)
+	headless = get_option('output','full') == 'headless'
+	dictICE,ICEdict,infodict = get_ICE(runID,infile,table)
 
-	argdict,vfdict,isdict,dfdict,metaldict,popdict,symdict = args(runID)
+	argdict,vfdict,isdict,dfdict,metaldict,popdict,symdict = args(runID,dictICE,table)
+	oritdict = orit(runID,infile,dictICE)
 
 	ICEss = {}
 	for key,value in dictICE.items():
@@ -608,15 +567,15 @@ def get_map(runID,infile,listgff):
 		regijs = key
 		genefile = os.path.join(final_dir,regi+'_gene.json')
 		infofile = os.path.join(final_dir,regi+'_info.json')
-		gcjson = os.path.join(js_dir,regijs+'_gc.js')
 		mapfile = os.path.join(js_dir,regijs+'.js')
 		htmlfile = os.path.join(final_dir,regi+'.html')
-		[myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,trnalist,locusdict] = value
+		[myDR1,myDR2,myDR3,myDR4,fICE,eICE,finalstart,finalend,trnalist] = value
 
 		start = finalstart
 		while start < fICE:
-			gene = zill(header,start)
-			s,e,strand,pro = posdict[gene]
+			gene = table.gene(start)
+			locus = table.locus_tag(start)
+			s,e,strand,pro = table.pos(start)
 			pos = s+'..'+e+' ['+strand+'], '+str(int(e)-int(s)+1)
 
 			feature = 'Flank'
@@ -627,7 +586,7 @@ def get_map(runID,infile,listgff):
 
 			start += 1
 			content = {
-					'gene':locusdict[gene],
+					'gene':locus,
 					'pos':pos,
 					'prod': product,
 					'featu': feature
@@ -637,8 +596,9 @@ def get_map(runID,infile,listgff):
 
 		mov = fICE
 		while mov <= eICE:
-			gene = zill(header,mov)
-			s,e,strand,pro = posdict[gene]
+			gene = table.gene(mov)
+			locus = table.locus_tag(mov)
+			s,e,strand,pro = table.pos(mov)
 			pos = s+'..'+e+' ['+strand+'], '+str(int(e)-int(s)+1)
 
 			if gene in ICEdict[key]:
@@ -657,7 +617,7 @@ def get_map(runID,infile,listgff):
 			feature,product = get_args(argdict,vfdict,isdict,dfdict,metaldict,popdict,symdict,gene,feature,product)
 			mov += 1
 			content = {
-					'gene':locusdict[gene],
+					'gene':locus,
 					'pos':pos,
 					'prod': product,
 					'featu': feature
@@ -665,8 +625,9 @@ def get_map(runID,infile,listgff):
 			genelist.append(content)				
 
 		while mov <= finalend:
-			gene = zill(header,mov)
-			s,e,strand,pro = posdict[gene]
+			gene = table.gene(mov)
+			locus = table.locus_tag(mov)
+			s,e,strand,pro = table.pos(mov)
 			pos = s+'..'+e+' ['+strand+'], '+str(int(e)-int(s)+1)
 
 			feature = 'Flank'
@@ -677,7 +638,7 @@ def get_map(runID,infile,listgff):
 
 			mov += 1
 			content = {
-					'gene':locusdict[gene],
+					'gene':locus,
 					'pos':pos,
 					'prod': product,
 					'featu': feature
@@ -687,10 +648,8 @@ def get_map(runID,infile,listgff):
 		with open(genefile,'w') as gene_file:
 			json.dump(genelist, gene_file, indent=4)
 
-		sgene = zill(header,fICE)
-		egene = zill(header,eICE)
-		s1,e1,strand1,pro1 = posdict[sgene]
-		s2,e2,strand2,pro2 = posdict[egene]
+		s1,e1,strand1,pro1 = table.pos(fICE)
+		s2,e2,strand2,pro2 = table.pos(eICE)
 		if myDR1 == '0':
 			myDR1 = '1'
 		gcc = gc(infile,int(myDR1),int(myDR4))
@@ -707,7 +666,7 @@ def get_map(runID,infile,listgff):
 		else:
 			trnaout = '-'
 
-		oritseqs = oritseq(runID, regi, infile, myDR1,myDR4)
+		oritseqs = oritdict[regi]
 #		oritdesc = "<br>".join([oritseqs[i:i+63] for i in range(0, len(oritseqs), 63)])
 
 		if 'IME' in regi:
@@ -730,6 +689,8 @@ def get_map(runID,infile,listgff):
 		}
 		with open(infofile,'w') as info_file:
 			json.dump(ICEinfo, info_file, indent=4)
+		if headless:
+			continue
 
 		i = 1
 		mapzlist = []
@@ -759,35 +720,9 @@ def get_map(runID,infile,listgff):
 				mapflist.append(anno)
 			i += 1
 
-		head = 'var borders = [];\nvar tta_codons = [];\nvar orfs ='
 		s = genelist[0]['pos'].split(' ')[0].split('..')[0]
 		e = genelist[-1]['pos'].split(' ')[0].split('..')[1]
-
-		gcdict = calculate_gc(infile, int(s), int(e), 500, 50)
-
-		with open(gcmap, 'r') as original_file:
-			original_content = original_file.read()
-		with open(gcjson,'w') as gein2:
-			gein2t = 'var jsonData = ' + str(gcdict)+';'
-			gein2.write(gein2t)
-			gein2.write(original_content)		
-
-#		with open(gcjson,'w') as gein2:
-#			json.dump(gcdict, gein2, indent=4)
-
-		maps = str(mapzlist)+';\nvar orfs2 ='+str(mapflist)+';\nvar clusterf2 = { start: '+s+', end: '+ \
-				  e+', idx: 1, orfs: orfs, borders: borders, tta_codons:tta_codons,\
-				  label: \'\', unordered: true };\nvar clusterr2 = { start: '+ s+', end: '+ \
-				  e+', idx: 2, orfs: orfs2, borders: borders, tta_codons:tta_codons,\
-				  label: \'\', unordered: true };\nsvgene.drawClusters("'+regijs+'", [clusterf2, clusterr2], 50, 920);'
-		with open(mapfile,'w') as map_file:
-			map_file.write(head + maps)
-
-		with open(viewfile, 'r') as file:
-			file_content = file.read()
-		new_content = file_content.replace('XXXX', regijs)
-		with open(htmlfile, 'w') as file:
-			file.write(new_content)
+		render_ice(regijs, mapfile, htmlfile, infile, s, e, mapzlist, mapflist)
 
 	return ICEss
 
@@ -813,20 +748,15 @@ def copy_files(source_dir, destination_dir):
                 destination_subdir = os.path.join(destination_dir, file)
                 copy_files(source_file, destination_subdir)
 
-def getfasta(runID,infile,key,s,e,stag,etag,locusdict):
+def getfasta(runID,infile,key,s,e,stag,etag,table):
 
-	faafile = os.path.join(tmp_dir, 'gbk', runID+'.faa')
+	faafile = os.path.join(ws.gb_dir, runID+'.faa')
 	outfa = os.path.join(workdir,'result',runID,key+'.fa')
 	outfaa = os.path.join(workdir,'result',runID,key+'.faa')
 
-	seq_record = SeqIO.read(infile, "fasta")
-	with open(outfa, "w") as output_handle1:
-		sequence = seq_record.seq[int(s)-1:int(e)]
-		ID = '_'.join(seq_record.id.split('_')[-2:])
-		seq_record.description = ''
-		seq_record.seq = sequence
-		seq_record.id = ID + ' ' + s +'-'+e
-		SeqIO.write(seq_record, output_handle1, "fasta")
+	genome = load_genome(infile)
+	ID = '_'.join(genome.id.split('_')[-2:])
+	genome.write_region(outfa, s, e, ID + ' ' + s +'-'+e)
 
 	faa_records = SeqIO.parse(faafile, "fasta")
 	with open(outfaa, "w") as output_handle2:
@@ -834,26 +764,18 @@ def getfasta(runID,infile,key,s,e,stag,etag,locusdict):
 			old_id = faa_record.id
 			seq_id = getnum(old_id)
 			if int(stag) <= seq_id <= int(etag):
-				new_id = locusdict.get(old_id, old_id)
-				faa_record.id = new_id
+				if seq_id in table.index:
+					faa_record.id = table.locus_tag(seq_id)
 				SeqIO.write(faa_record, output_handle2, "fasta")
 
-def getbase(runID,filetype,homelist,final_dir):
+def getbase(runID,homelist,final_dir):
 
-	infile = os.path.join(in_dir,runID)
 	final_dir = os.path.join(workdir,'result',runID)
 	basefile = os.path.join(final_dir, runID+'_info.json')
-
-	if filetype == 'gb':
-		filet = 'genbank'
-	else:
-		filet = 'fasta'
-	for seq_record in SeqIO.parse(infile, filet):
-		realID = seq_record.id
-		realID = realID[:15]
-		desc = seq_record.description
-		lengt = len(seq_record.seq)
-		gcs = "%.2f"%GC(seq_record.seq)
+	seqinfo = get_stage(runID,'sequence')
+	realID = seqinfo['name']
+	lengt = seqinfo['length']
+	gcs = seqinfo['gc']
 
 	basedict = {'JobID':runID,
 		    'Submission date':get_time(),
@@ -870,19 +792,20 @@ def _single(runID,infile,filetype):
 	if not os.path.exists(final_dir):
 		os.makedirs(final_dir)
 
+	headless = get_option('output','full') == 'headless'
 	js_dir = os.path.join(workdir,'result',runID,'js')
-	if not os.path.exists(js_dir):
+	if not headless and not os.path.exists(js_dir):
 		os.makedirs(js_dir)
-	jsback = os.path.join(workdir,'script','js')
 
 	if  filetype == 'fa':
-		prokkanno(runID,infile)
-		trnadict,posdict,header,totalnum,locusdict = getgff1(runID)
+		if not is_done(runID,'annotation'):
+			prokkanno(runID,infile)
+			mark_done(runID,'annotation',outputs=[os.path.join(ws.gb_dir,runID+'.'+ext) for ext in ['gff','faa']])
+		table = getgff1(runID)
 	else:
-		trnadict,posdict,header,totalnum,locusdict = getgff(runID)
-	listgff = [trnadict,posdict,header,totalnum,locusdict]
+		table = getgff(runID)
 	
-	ICEss = get_map(runID,infile,listgff)
+	ICEss = get_map(runID,infile,table)
 	
 	i = 1 
 	ICEsumlist = []
@@ -918,16 +841,14 @@ def _single(runID,infile,filetype):
 			   }
 			homelist.append(homedict)
 			ICEsumlist.append(ICEs)
-			getfasta(runID,infile,key,s,e,stag,etag,locusdict)
+			getfasta(runID,infile,key,s,e,stag,etag,table)
 			i += 1
 
 	ICEsum = os.path.join(final_dir, runID+'_ICEsum.json')
 	with open(ICEsum,'w') as ice_file:
 		json.dump(ICEsumlist, ice_file, indent=4)
 
-	copy_files(jsback, js_dir)
-	getbase(runID,filetype,homelist,final_dir)
+	getbase(runID,homelist,final_dir)
 
-	tmpfile = os.path.join(tmp_dir,runID)
-	shutil.rmtree(tmpfile)
+	ws.close_run()
 
@@ -0,0 +1,118 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,sys,threading
+from collections import OrderedDict
+from ete3 import NCBITaxa
+from script.config import get_option
+
+cache = OrderedDict()
+lock = threading.Lock()
+maxcache = 65536
+ncbi = None
+taxtable = None
+
+def get_ncbi():
+
+	global ncbi
+	with lock:
+		if ncbi is None:
+			ncbi = NCBITaxa()
+	return ncbi
+
+def load_table():
+
+	global taxtable
+	with lock:
+		if taxtable is None:
+			taxtable = {}
+			tablefile = get_option('taxtable', '')
+			if tablefile and os.path.isfile(tablefile):
+				with open(tablefile,'r') as tabin:
+					for line in tabin:
+						lines = line.rstrip('\n').split('\t')
+						if len(lines) == 3:
+							taxtable[lines[0]] = (lines[1],lines[2])
+	return taxtable
+
+def pick_ranks(lineage, ranks):
+
+	ranks2lineage = dict((ranks[taxid],taxid) for taxid in lineage if taxid in ranks)
+
+	spid,strainid = None,None
+	if 'species' in ranks2lineage:
+		spid = ranks2lineage['species']
+		strainid = ranks2lineage.get('strain')
+	elif 'genus' in ranks2lineage:
+		spid = ranks2lineage['genus']
+	elif 'phylum' in ranks2lineage:
+		spid = ranks2lineage['phylum']
+	return spid,strainid
+
+def lookup(taxids):
+
+	db = get_ncbi()
+	lineages = {}
+	for taxid in taxids:
+		try:
+			lineages[taxid] = db.get_lineage(taxid)
+		except ValueError:
+			lineages[taxid] = []
+
+	ranks = db.get_rank(set(t for lineage in lineages.values() for t in lineage))
+	picked = dict((taxid,pick_ranks(lineage,ranks)) for taxid,lineage in lineages.items())
+	names = db.get_taxid_translator(set(t for ids in picked.values() for t in ids if t))
+
+	resdict = {}
+	for taxid,[spid,strainid] in picked.items():
+		resdict[taxid] = (names.get(spid,'-'),names.get(strainid,''))
+	return resdict
+
+def resolve(taxids):
+
+	table = load_table()
+	resdict = {}
+	todo = []
+	with lock:
+		for taxid in set(str(t) for t in taxids):
+			if taxid in table:
+				resdict[taxid] = table[taxid]
+			elif taxid in cache:
+				cache.move_to_end(taxid)
+				resdict[taxid] = cache[taxid]
+			else:
+				todo.append(taxid)
+	if todo:
+		found = lookup(todo)
+		resdict.update(found)
+		with lock:
+			cache.update(found)
+			while len(cache) > maxcache:
+				cache.popitem(last=False)
+	return resdict
+
+def get_ranks(taxid):
+
+	return resolve([taxid])[str(taxid)]
+
+def build_table(report, tablefile):
+
+	taxids = []
+	with open(report,'r') as repin:
+		for line in repin:
+			lines = line.strip().split('\t')
+			if len(lines) > 4 and lines[4].strip().isdigit() and lines[4].strip() != '0':
+				taxids.append(lines[4].strip())
+
+	resdict = resolve(taxids)
+	with open(tablefile,'w') as tabout:
+		for taxid in sorted(resdict, key=int):
+			tabout.write('\t'.join([taxid,resdict[taxid][0],resdict[taxid][1]])+'\n')
+	return tablefile
+
+if __name__ == '__main__':
+
+	if len(sys.argv) != 3:
+		print('Usage: python -m script.taxonomy <kraken2 report with --report-zero-counts> <output table>')
+		sys.exit(1)
+	build_table(sys.argv[1],sys.argv[2])
@@ -0,0 +1,76 @@
+#!/public/wangm/miniconda3/bin/python
+# -*- coding: utf-8 -*-
+
+import os,sys,fcntl,shutil
+from script.config import get_param, get_option
+from script.genome import drop_genomes
+
+param = get_param()
+workdir = param[0]
+
+tmp_dir = os.path.join(workdir,'tmp')
+in_dir = os.path.join(tmp_dir,'fasta')
+gb_dir = os.path.join(tmp_dir,'gbk')
+lockfile = None
+
+def get_scratch():
+
+	return get_option('scratch', '') or os.path.join(workdir,'tmp')
+
+def set_dirs(path):
+
+	global tmp_dir,in_dir,gb_dir
+	tmp_dir = path
+	in_dir = os.path.join(path,'fasta')
+	gb_dir = os.path.join(path,'gbk')
+	for dirs in [tmp_dir,in_dir,gb_dir]:
+		os.makedirs(dirs, exist_ok=True)
+
+def open_run(runID):
+
+	global lockfile
+	release()
+	scratch = get_scratch()
+	os.makedirs(scratch, exist_ok=True)
+	lockpath = os.path.join(scratch, runID+'.lock')
+	while True:
+		lockfile = open(lockpath, 'a')
+		try:
+			fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+		except OSError:
+			lockfile.close()
+			lockfile = None
+			print('ERROR: Another run with JobID '+runID+' is using '+scratch+'! Please use a different JobID.')
+			sys.exit()
+		try:
+			if os.stat(lockpath).st_ino == os.fstat(lockfile.fileno()).st_ino:
+				break
+		except FileNotFoundError:
+			pass
+		lockfile.close()
+	set_dirs(os.path.join(scratch, runID))
+	return tmp_dir
+
+def reset():
+
+	drop_genomes(tmp_dir)
+	shutil.rmtree(tmp_dir, ignore_errors=True)
+	set_dirs(tmp_dir)
+
+def release():
+
+	global lockfile
+	if lockfile:
+		lockfile.close()
+		lockfile = None
+
+def close_run():
+
+	drop_genomes(tmp_dir)
+	shutil.rmtree(tmp_dir, ignore_errors=True)
+	if lockfile:
+		try:
+			os.remove(lockfile.name)
+		except FileNotFoundError:
+			pass
+	release()